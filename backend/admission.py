@@ -0,0 +1,224 @@
+"""Admission control for the public API.
+
+Every public request is classified into a route class (registration, gallery
+reads, QR codes, SSE streams). Before it reaches the app it has to pass:
+
+1. a per-client token bucket (keyed by client IP), when client addresses
+   are trustworthy,
+2. a global token bucket shared by all clients, where heavy classes stop
+   being admitted once the bucket drops below a reserve that only
+   ``priority`` classes (gallery reads) may spend,
+3. the route class' concurrency cap, with a short bounded wait.
+
+Classes with ``rate_limited=False`` (cheap reads a single page fires by the
+hundred, like gallery images) skip both token buckets and are only bounded
+by their concurrency cap.
+
+Rejections are answered immediately: 429 with Retry-After when a rate limit
+is hit, 503 when the server is saturated. Nothing queues without bound.
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at ``rate`` tokens per second"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float = 1, reserve: float = 0) -> float:
+        """Take ``cost`` tokens, keeping ``reserve`` untouched.
+
+        Returns 0 on success, otherwise the seconds until enough tokens are back.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens - cost >= reserve:
+            self.tokens -= cost
+            return 0.0
+        if self.rate <= 0:
+            return 60.0
+        return (cost + reserve - self.tokens) / self.rate
+
+
+class ClientBuckets:
+    """Per-client token buckets, keeping only the most recently seen clients"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()
+
+    def take(self, client: str, cost: float = 1) -> float:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(cost)
+
+
+class RouteClass:
+    """A group of routes sharing a cost, a concurrency cap and a priority.
+
+    ``limit`` requests run at once; up to ``max_waiting`` more wait at most
+    ``wait_timeout`` seconds for a slot. ``limit=0`` disables the cap (used for
+    long-lived SSE streams, which are only rate limited).
+    """
+
+    def __init__(self, name: str, cost: float = 1, limit: int = 0, max_waiting: int = 0,
+                 wait_timeout: float = 0.0, priority: bool = False, rate_limited: bool = True):
+        self.name = name
+        self.cost = cost
+        self.rate_limited = rate_limited
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.priority = priority
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def acquire(self) -> bool:
+        if self._semaphore is None:
+            self.active += 1
+            return True
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+        elif self.waiting >= self.max_waiting or self.wait_timeout <= 0:
+            return False
+        else:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.wait_timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class AdmissionController:
+    """Decides whether a request may enter; see the module docstring"""
+
+    def __init__(self, routes: List[Tuple[str, str, RouteClass]], client_buckets: Optional[ClientBuckets],
+                 global_bucket: TokenBucket, priority_reserve: float = 0.2,
+                 on_reject: Optional[Callable[[str, str], None]] = None, enabled: bool = True):
+        # (method, path prefix, class); first match wins
+        self.routes = routes
+        self.enabled = enabled
+        # None: no per-client limits (e.g. every request arrives from the same proxy)
+        self.client_buckets = client_buckets
+        self.global_bucket = global_bucket
+        self.priority_reserve = priority_reserve * global_bucket.burst
+        self.on_reject = on_reject
+
+    def classify(self, method: str, path: str) -> Optional[RouteClass]:
+        for route_method, prefix, route_class in self.routes:
+            if (route_method == '*' or route_method == method) and path.startswith(prefix):
+                return route_class
+        return None
+
+    def check_rates(self, route_class: RouteClass, client: str) -> Optional[Tuple[int, str, float]]:
+        """(status, reason, retry_after) if the request must be rejected, else None"""
+        if not route_class.rate_limited:
+            return None
+        wait = self.client_buckets.take(client, route_class.cost) if self.client_buckets else 0
+        if wait:
+            return 429, 'client_rate', wait
+        reserve = 0 if route_class.priority else self.priority_reserve
+        wait = self.global_bucket.take(route_class.cost, reserve)
+        if wait:
+            return 503, 'global_rate', wait
+        return None
+
+    def reject(self, route_class: RouteClass, reason: str):
+        if self.on_reject:
+            self.on_reject(route_class.name, reason)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an AdmissionController.
+
+    A concurrency slot is held until the response has been fully sent, so
+    streamed files count against their class for as long as they take.
+    """
+
+    MESSAGES = {
+        'client_rate': "Too many requests, slow down",
+        'global_rate': "Server is busy, try again shortly",
+        'concurrency': "Server is busy, try again shortly",
+    }
+
+    def __init__(self, app, controller: AdmissionController, client_ip_header: Optional[str] = None):
+        self.app = app
+        self.controller = controller
+        self.client_ip_header = client_ip_header.lower().encode() if client_ip_header else None
+
+    def client_key(self, scope) -> str:
+        if self.client_ip_header:
+            for name, value in scope.get('headers', []):
+                if name == self.client_ip_header:
+                    # X-Forwarded-For may hold a chain. Only the right-most entry was
+                    # appended by our proxy; the ones before it come from the client
+                    # and can be anything
+                    return value.decode('latin-1').split(',')[-1].strip()
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not self.controller.enabled:
+            await self.app(scope, receive, send)
+            return
+        route_class = self.controller.classify(scope['method'], scope['path'])
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+
+        rejected = self.controller.check_rates(route_class, self.client_key(scope))
+        if rejected:
+            status, reason, retry_after = rejected
+            self.controller.reject(route_class, reason)
+            await self.respond(send, status, reason, retry_after)
+            return
+        if not await route_class.acquire():
+            self.controller.reject(route_class, 'concurrency')
+            await self.respond(send, 503, 'concurrency', 1)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            route_class.release()
+
+    async def respond(self, send, status: int, reason: str, retry_after: float):
+        body = json.dumps({"detail": self.MESSAGES[reason]}).encode()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(max(1, int(retry_after + 0.999))).encode()),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
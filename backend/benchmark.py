@@ -0,0 +1,438 @@
+"""Offline benchmark for the face detection and matching pipeline.
+
+Runs the pipeline in-process against an in-memory Mongo (mongomock-motor) with
+synthetic encodings and the sample photos in uploads/original, then reports
+throughput and p50/p95/p99 latencies and writes them as JSON so runs can be
+compared between releases.
+
+Usage:
+    python benchmark.py                                  # default suite
+    python benchmark.py --users 1000 10000 --output bench.json
+    python benchmark.py --only match gallery
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).parent
+SAMPLE_DIR = ROOT_DIR.parent / 'uploads' / 'original'
+SAMPLE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Keep benchmark files out of the real upload directory. Must be set before
+# importing server, which creates its directories at import time.
+os.environ['UPLOAD_DIR'] = tempfile.mkdtemp(prefix='cameo-bench-')
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except ImportError:
+    print("mongomock-motor is required for the benchmark: pip install mongomock-motor")
+    raise
+
+import server  # noqa: E402
+
+# Per-image / per-request INFO logs would dominate the timings
+server.logger.setLevel(logging.WARNING)
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+BENCHMARKS = ['cold_start', 'decode', 'recall', 'encode', 'detect', 'match', 'index_load', 'upload', 'gallery', 'overload']
+
+
+def summarize(name: str, samples: list, **extra) -> dict:
+    """Turn per-iteration wall times (seconds) into a result record"""
+    arr = np.asarray(samples, dtype=np.float64)
+    total = float(arr.sum())
+    result = {
+        "name": name,
+        "iterations": int(arr.size),
+        "total_s": round(total, 6),
+        "throughput_per_s": round(arr.size / total, 3) if total > 0 else None,
+        "p50_ms": round(float(np.percentile(arr, 50)) * 1000, 3),
+        "p95_ms": round(float(np.percentile(arr, 95)) * 1000, 3),
+        "p99_ms": round(float(np.percentile(arr, 99)) * 1000, 3),
+    }
+    result.update(extra)
+    return result
+
+
+def timed(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def timed_async(fn, iterations: int) -> list:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def sample_photos(folder: Path = SAMPLE_DIR) -> list:
+    return sorted(p for p in folder.glob('*') if p.suffix.lower() in SAMPLE_EXTENSIONS)
+
+
+def synthetic_encodings(rng, count: int) -> np.ndarray:
+    """Random unit-scale vectors shaped like dlib's 128-d face descriptors"""
+    enc = rng.normal(size=(count, 128))
+    enc /= np.linalg.norm(enc, axis=1, keepdims=True)
+    return enc * 0.7
+
+
+def synthetic_users(rng, count: int, event_id: str) -> list:
+    encodings = synthetic_encodings(rng, count)
+    return [{
+        "id": str(uuid.uuid4()),
+        "name": f"user-{i}",
+        "email": f"user-{i}@bench.local",
+        "phone": "0",
+        "gallery_id": uuid.uuid4().hex[:8],
+        "event_id": event_id,
+        "face_encoding": server.pack_encoding(encodings[i]),
+        "encoding_model": server.ENCODING_MODEL,
+        "created_at": "1970-01-01T00:00:00+00:00",
+    } for i in range(count)]
+
+
+def face_recognition_available() -> bool:
+    try:
+        import face_recognition  # noqa: F401
+        return True
+    except Exception:
+        return False
+
+
+# Runs in a fresh interpreter per iteration; prints one JSON line of timings
+COLD_START_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import server
+imported = time.perf_counter()
+ready = server.face_models.load()
+loaded = time.perf_counter()
+photo = sys.argv[1] if len(sys.argv) > 1 else None
+first = second = loaded
+if ready and photo:
+    server.detect_faces(photo)
+    first = time.perf_counter()
+    server.detect_faces(photo)
+    second = time.perf_counter()
+print(json.dumps({"ready": ready, "import": imported - start, "models": loaded - imported,
+                  "first_detect": first - loaded, "warm_detect": second - first}))
+"""
+
+
+def bench_cold_start(args, rng) -> list:
+    """Process start to first processed photo: server import, model load and warm-up"""
+    photos = sample_photos()
+    cmd = [sys.executable, '-c', COLD_START_SCRIPT] + ([str(photos[0])] if photos else [])
+    runs = []
+    for _ in range(args.cold_iterations):
+        out = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    if not runs[0]['ready']:
+        return [summarize("cold_start.import", [r['import'] for r in runs]),
+                {"name": "cold_start.models", "skipped": "face_recognition unavailable"}]
+    results = [summarize(f"cold_start.{stage}", [r[stage] for r in runs])
+               for stage in ('import', 'models')]
+    if photos:
+        results += [summarize(f"cold_start.{stage}", [r[stage] for r in runs], photo=photos[0].name)
+                    for stage in ('first_detect', 'warm_detect')]
+    return results
+
+
+def bench_decode(args, rng) -> list:
+    """Full-size decode vs. load_image (draft mode + EXIF) on a large camera-sized JPEG"""
+    from PIL import Image
+    photos = [p for p in sample_photos() if p.suffix.lower() in ('.jpg', '.jpeg')]
+    source = Image.open(photos[0]).convert('RGB') if photos else \
+        Image.fromarray(rng.integers(0, 255, (480, 640, 3), dtype=np.uint8))
+    width = int((args.decode_megapixels * 1e6 * 4 / 3) ** 0.5)
+    path = Path(os.environ['UPLOAD_DIR']) / 'bench-large.jpg'
+    source.resize((width, width * 3 // 4)).save(path, quality=90)
+
+    def full_decode():
+        with Image.open(path) as img:
+            return np.asarray(img.convert('RGB'))
+
+    results = []
+    for name, fn in (("decode.full", full_decode),
+                     ("decode.load_image", lambda: server.load_image(path, args.max_sides[-1])[0])):
+        samples = timed(fn, args.iterations)
+        results.append(summarize(name, samples, megapixels=args.decode_megapixels,
+                                 array_mb=round(fn().nbytes / 2 ** 20, 1)))
+    return results
+
+
+def bench_recall(args, rng) -> list:
+    """Faces detected with each --max-sides decode, relative to full resolution.
+
+    Run it on real event photos (--recall-photos): downscaling makes detection
+    faster but loses faces that end up below the detector's minimum size.
+    """
+    photos = sample_photos(Path(args.recall_photos)) if args.recall_photos else sample_photos()
+    if not photos or not face_recognition_available() or not server.face_models.load():
+        return [{"name": "recall", "skipped": "face_recognition or sample photos unavailable"}]
+    face_recognition = server.face_models.face_recognition
+    full = [len(face_recognition.face_locations(server.load_image(p)[0])) for p in photos]
+    results = []
+    for max_side in args.max_sides:
+        samples, found = [], 0
+        for photo, expected in zip(photos, full):
+            start = time.perf_counter()
+            faces = face_recognition.face_locations(server.load_image(photo, max_side)[0])
+            samples.append(time.perf_counter() - start)
+            found += min(len(faces), expected)
+        results.append(summarize(f"recall[{max_side}]", samples, photos=len(photos), faces_full=sum(full),
+                                 faces_found=found, recall=round(found / sum(full), 3) if sum(full) else None))
+    return results
+
+
+def bench_encode(args, rng) -> list:
+    """Registration path: base64 selfie -> single encoding"""
+    import base64
+    photos = sample_photos()
+    if not photos or not face_recognition_available():
+        return [{"name": "encode", "skipped": "face_recognition or sample photos unavailable"}]
+    payloads = [base64.b64encode(p.read_bytes()).decode() for p in photos]
+    it = iter(range(args.iterations))
+    samples = timed(lambda: server.encode_face_from_base64(payloads[next(it) % len(payloads)]), args.iterations)
+    return [summarize("encode", samples, photos=len(payloads))]
+
+
+def bench_detect(args, rng) -> list:
+    """process_image_for_faces on the sample photos"""
+    photos = sample_photos()
+    if not photos or not face_recognition_available():
+        return [{"name": "detect", "skipped": "face_recognition or sample photos unavailable"}]
+    it = iter(range(args.iterations))
+    samples = timed(lambda: server.process_image_for_faces(str(photos[next(it) % len(photos)])), args.iterations)
+    return [summarize("detect", samples, photos=len(photos))]
+
+
+def bench_match(args, rng) -> list:
+    """Match a photo's faces against an event of N users"""
+    results = []
+    for n_users in args.users:
+        index = server.EventEncodingIndex(synthetic_users(rng, n_users, 'bench'))
+        faces = synthetic_encodings(rng, args.faces).tolist()
+        samples = timed(lambda: index.match(faces), args.iterations)
+        results.append(summarize(f"match[{n_users}]", samples, users=n_users, faces=args.faces))
+    return results
+
+
+async def bench_index_load(args, rng) -> list:
+    """Building the per-event encoding index from Mongo"""
+    event_id = 'bench-index'
+    await server.db.users.insert_many(synthetic_users(rng, args.load_users, event_id))
+
+    async def load():
+        await server.invalidate_event_encoding_index(event_id)
+        await server.get_event_encoding_index(event_id)
+
+    samples = await timed_async(load, max(1, args.iterations // 10))
+    return [summarize("index_load", samples, users=args.load_users)]
+
+
+async def bench_upload(args, rng) -> list:
+    """Admin upload of one photo: file write plus metadata insert"""
+    from starlette.datastructures import UploadFile
+    photos = sample_photos()
+    payload = photos[0].read_bytes() if photos else rng.bytes(256 * 1024)
+    counter = iter(range(args.iterations))
+
+    async def upload():
+        name = f"bench-{next(counter)}.jpg"
+        await server.upload_images(files=[UploadFile(file=io.BytesIO(payload), filename=name)], event_id=None)
+
+    samples = await timed_async(upload, args.iterations)
+    return [summarize("upload", samples, bytes=len(payload))]
+
+
+async def bench_gallery(args, rng) -> list:
+    """Gallery listing for a user with many matched photos"""
+    user = synthetic_users(rng, 1, server.DEFAULT_EVENT_ID)[0]
+    await server.db.users.insert_one(user)
+    for i in range(args.gallery_images):
+        key = server.get_gallery_key(server.DEFAULT_EVENT_ID, user['gallery_id'], f"photo-{i}.jpg")
+        server.storage.save(key, io.BytesIO(b'\xff\xd8\xff'))
+
+    samples = await timed_async(lambda: server.get_gallery(user['gallery_id']), args.iterations)
+    return [summarize("gallery", samples, images=args.gallery_images)]
+
+
+async def bench_overload(args, rng) -> list:
+    """Load test: a registration flood from many clients while guests browse a gallery.
+
+    Runs once with admission control off and once on. Registrations burn CPU
+    while holding the GIL, like a Python-heavy encoder would, so without
+    admission they starve the event loop and gallery p99 climbs. With
+    admission, excess registrations get fast 429/503s and gallery reads stay
+    flat.
+    """
+    import httpx
+
+    user = synthetic_users(rng, 1, server.DEFAULT_EVENT_ID)[0]
+    await server.db.users.insert_one(user)
+    for i in range(50):
+        key = server.get_gallery_key(server.DEFAULT_EVENT_ID, user['gallery_id'], f"overload-{i}.jpg")
+        server.storage.save(key, io.BytesIO(b'\xff\xd8\xff'))
+
+    def spin(n: int):
+        x = 0
+        for i in range(n):
+            x += i
+        return x
+
+    # Calibrate a fixed amount of work, so contention makes it slower rather than cheaper
+    start = time.perf_counter()
+    spin(200000)
+    work = int(200000 * args.overload_encode_ms / 1000 / (time.perf_counter() - start))
+
+    def busy_encode(data):
+        spin(work)
+        return None  # "no face": the request does the work but leaves no user behind
+
+    def client(ip: str):
+        transport = httpx.ASGITransport(app=server.app, client=(ip, 40000))
+        return httpx.AsyncClient(transport=transport, base_url='http://bench')
+
+    async def phase(enabled: bool) -> list:
+        server.admission.enabled = enabled
+        deadline = time.perf_counter() + args.overload_seconds
+        gallery_ms, register_ok, rejected = [], [], []
+
+        async def flood(ip: str):
+            async with client(ip) as c:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    r = await c.post('/api/register', json={
+                        "name": "x", "email": "x@example.com", "phone": "0", "face_image_data": "x"})
+                    (rejected if r.status_code in (429, 503) else register_ok).append(time.perf_counter() - start)
+                    if r.status_code in (429, 503):
+                        await asyncio.sleep(0.05)
+
+        async def browse(ip: str):
+            async with client(ip) as c:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    r = await c.get(f"/api/gallery/{user['gallery_id']}")
+                    if r.status_code == 200:
+                        gallery_ms.append(time.perf_counter() - start)
+                    await asyncio.sleep(0.02)
+
+        await asyncio.gather(*(flood(f"10.0.{i // 250}.{i % 250}") for i in range(args.overload_clients)),
+                             *(browse(f"10.1.0.{i}") for i in range(5)))
+        label = 'on' if enabled else 'off'
+        results = [summarize(f"overload[{label}].gallery", gallery_ms, clients=args.overload_clients)]
+        if register_ok:
+            results.append(summarize(f"overload[{label}].register", register_ok))
+        if rejected:
+            results.append(summarize(f"overload[{label}].rejected", rejected))
+        return results
+
+    original_encode = server.encode_face_from_base64
+    original_buckets = server.admission.client_buckets
+    server.encode_face_from_base64 = busy_encode
+    # Clients connect directly with distinct addresses, as if CLIENT_IP_HEADER were set
+    server.admission.client_buckets = server.ClientBuckets(server.RATE_LIMIT_CLIENT_RPS, server.RATE_LIMIT_CLIENT_BURST)
+    try:
+        return await phase(False) + await phase(True)
+    finally:
+        server.encode_face_from_base64 = original_encode
+        server.admission.client_buckets = original_buckets
+        server.admission.enabled = server.RATE_LIMIT_ENABLED
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return 'unknown'
+
+
+async def run(args) -> dict:
+    server.client = AsyncMongoMockClient()
+    server.db = server.client['benchmark']
+    rng = np.random.default_rng(args.seed)
+
+    runners = {
+        'cold_start': bench_cold_start,
+        'decode': bench_decode,
+        'recall': bench_recall,
+        'encode': bench_encode,
+        'detect': bench_detect,
+        'match': bench_match,
+        'index_load': bench_index_load,
+        'upload': bench_upload,
+        'gallery': bench_gallery,
+        'overload': bench_overload,
+    }
+    results = []
+    for name in args.only or BENCHMARKS:
+        runner = runners[name]
+        out = runner(args, rng)
+        if asyncio.iscoroutine(out):
+            out = await out
+        for record in out:
+            print(json.dumps(record))
+        results.extend(out)
+
+    return {
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "params": {k: v for k, v in vars(args).items() if k != 'output'},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the face processing pipeline")
+    parser.add_argument('--users', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help="event sizes to match against")
+    parser.add_argument('--faces', type=int, default=5, help="faces per synthetic photo when matching")
+    parser.add_argument('--load-users', type=int, default=10000, help="users inserted for the index load benchmark")
+    parser.add_argument('--gallery-images', type=int, default=500, help="photos in the benchmarked gallery")
+    parser.add_argument('--decode-megapixels', type=float, default=24, help="size of the JPEG used by decode")
+    parser.add_argument('--max-sides', type=int, nargs='+', default=[3200, 2400, 1600],
+                        help="DETECTION_MAX_SIDE values compared by recall (the last one is used by decode)")
+    parser.add_argument('--recall-photos', help="folder of real event photos for recall (default: the samples)")
+    parser.add_argument('--overload-clients', type=int, default=100, help="flooding clients in overload")
+    parser.add_argument('--overload-seconds', type=float, default=5, help="duration of each overload phase")
+    parser.add_argument('--overload-encode-ms', type=float, default=20,
+                        help="CPU time of one simulated registration encode")
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--cold-iterations', type=int, default=3, help="fresh processes started for cold_start")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS)
+    parser.add_argument('--output', default='bench_results.json', help="where to write the JSON results")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
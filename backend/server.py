@@ -1,23 +1,37 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, Form, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, Form, HTTPException, BackgroundTasks, Request
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from bson import Binary
+from pymongo import CursorType, UpdateOne, ReturnDocument
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from typing import BinaryIO, List, Optional, Tuple, Union
 import uuid
-from datetime import datetime, timezone
+import re
+from datetime import datetime, timezone, timedelta
 import numpy as np
-import qrcode
 import io
 import base64
 import shutil
 import json
-from passlib.context import CryptContext
+import asyncio
+import signal
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, start_http_server
+from PIL import Image, ImageOps
+from storage import LocalStorage, S3Storage
+from admission import AdmissionController, AdmissionMiddleware, ClientBuckets, RouteClass, TokenBucket
 
 
 ROOT_DIR = Path(__file__).parent
@@ -40,9 +54,75 @@ ORIGINAL_DIR = UPLOAD_DIR / 'original'
 USERS_DIR = UPLOAD_DIR / 'users'
 TEMP_DIR = UPLOAD_DIR / 'temp'
 FACES_DIR = UPLOAD_DIR / 'faces'
+EVENTS_DIR = UPLOAD_DIR / 'events'
+
+# Events partition users, images and storage. The default event keeps using the
+# legacy top-level directories so existing single-event deployments keep working.
+DEFAULT_EVENT_ID = getenv_strip('DEFAULT_EVENT_ID') or 'default'
+EVENT_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+MATCH_TOLERANCE = float(getenv_strip('MATCH_TOLERANCE') or 0.6)
+# How detected faces are assigned to users: 'greedy' or 'hungarian' (needs scipy)
+MATCH_ASSIGNMENT = (getenv_strip('MATCH_ASSIGNMENT') or 'greedy').lower()
+# Worker threads shared by all events for CPU-bound face processing
+PROCESSING_WORKERS = int(getenv_strip('PROCESSING_WORKERS') or (os.cpu_count() or 1))
+# Images processed concurrently within a single event
+EVENT_PROCESSING_CONCURRENCY = int(getenv_strip('EVENT_PROCESSING_CONCURRENCY') or 1)
+# Add Server-Timing / X-Process-Time headers to every response when enabled
+TIMING_HEADERS = (getenv_strip('TIMING_HEADERS') or '').lower() in ('1', 'true', 'yes')
+# Server-Sent Events: per-subscriber backlog and keepalive interval
+SSE_QUEUE_SIZE = int(getenv_strip('SSE_QUEUE_SIZE') or 100)
+SSE_HEARTBEAT_SECONDS = float(getenv_strip('SSE_HEARTBEAT_SECONDS') or 15)
+# Hot-folder ingestion for tethered cameras / shares (disabled unless HOT_FOLDER is set)
+HOT_FOLDER = getenv_strip('HOT_FOLDER')
+HOT_FOLDER_EVENT_ID = getenv_strip('HOT_FOLDER_EVENT_ID') or DEFAULT_EVENT_ID
+# inotify does not see writes made by other hosts on network shares; poll there
+HOT_FOLDER_POLLING = (getenv_strip('HOT_FOLDER_POLLING') or '').lower() in ('1', 'true', 'yes')
+# A file is ingested once its size and mtime have been stable this long
+HOT_FOLDER_SETTLE_SECONDS = float(getenv_strip('HOT_FOLDER_SETTLE_SECONDS') or 2)
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+# Face encodings are stored as packed little-endian float32 blobs tagged with the model that produced them
+ENCODING_DTYPE = np.dtype('<f4')
+ENCODING_DIM = 128
+ENCODING_MODEL = 'dlib_resnet_v1'
+# Reference encodings kept per user (selfies plus optional auto-enrolled event matches)
+MAX_REFERENCE_ENCODINGS = int(getenv_strip('MAX_REFERENCE_ENCODINGS') or 5)
+# Event-photo matches at least this close are added as references (unset = disabled)
+AUTO_ENROLL_DISTANCE = float(getenv_strip('AUTO_ENROLL_DISTANCE') or 0) or None
+# Aligned face chips stored under faces/<image_id>/<face_index>.jpg during processing
+FACE_CROPS = (getenv_strip('FACE_CROPS') or '1').lower() in ('1', 'true', 'yes')
+FACE_CHIP_SIZE = 150  # dlib's face recognition network input size
+FACE_CHIP_PADDING = 0.25
+# Photos are decoded at most this large (longest side, px) for face detection;
+# JPEGs are DCT-scaled while decoding. 0 decodes at full resolution.
+DETECTION_MAX_SIDE = int(getenv_strip('DETECTION_MAX_SIDE') or 0)
+# Load the dlib models when the process starts instead of on the first photo
+PRELOAD_MODELS = (getenv_strip('PRELOAD_MODELS') or '1').lower() in ('1', 'true', 'yes')
+# Purges delete this many images/users per round (one $in query each) using a
+# separate thread pool for file removal, so they never compete with face processing
+DELETE_BATCH_SIZE = int(getenv_strip('DELETE_BATCH_SIZE') or 200)
+DELETE_WORKERS = int(getenv_strip('DELETE_WORKERS') or 8)
+# 'inline': the API process runs face processing itself. 'worker': the API only
+# records work; separately launched `python -m server worker` processes claim it
+PROCESSING_MODE = (getenv_strip('PROCESSING_MODE') or 'inline').lower()
+# Images claimed per worker round trip and how long a claim (lease) is valid
+WORKER_BATCH_SIZE = int(getenv_strip('WORKER_BATCH_SIZE') or 8)
+WORKER_LEASE_SECONDS = float(getenv_strip('WORKER_LEASE_SECONDS') or 300)
+# Workers retry a host-path original they cannot read this many times before giving up
+MISSING_ORIGINAL_ATTEMPTS = int(getenv_strip('MISSING_ORIGINAL_ATTEMPTS') or 3)
+# Idle workers poll this often when Mongo change streams are unavailable
+WORKER_POLL_SECONDS = float(getenv_strip('WORKER_POLL_SECONDS') or 2)
+WORKER_METRICS_PORT = int(getenv_strip('WORKER_METRICS_PORT') or 0)
+# How often API processes pick up progress events relayed by workers
+PIPELINE_EVENTS_POLL_SECONDS = float(getenv_strip('PIPELINE_EVENTS_POLL_SECONDS') or 0.5)
+# Size of the capped collection holding relayed events (oldest are evicted first)
+PIPELINE_EVENTS_CAP_BYTES = int(getenv_strip('PIPELINE_EVENTS_CAP_BYTES') or 16 * 1024 * 1024)
+# Identifies this process as the owner of image leases
+PROCESS_ID = f"{socket.gethostname()}-{os.getpid()}"
+# Where originals and galleries live: 'local' (UPLOAD_DIR) or 's3' (any S3-compatible endpoint)
+STORAGE_BACKEND = (getenv_strip('STORAGE_BACKEND') or 'local').lower()
 
 # Ensure directories exist (safe on all platforms)
-for _dir in [ORIGINAL_DIR, USERS_DIR, TEMP_DIR, FACES_DIR]:
+for _dir in [ORIGINAL_DIR, USERS_DIR, TEMP_DIR, FACES_DIR, EVENTS_DIR]:
     try:
         _dir.mkdir(parents=True, exist_ok=True)
     except Exception:
@@ -74,8 +154,208 @@ except Exception as e:
     # Re-raise so startup fails loudly in container environments where DB is required
     raise
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing; only the admin login needs it, so it is not loaded by workers
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    from passlib.context import CryptContext
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# Prometheus metrics, exposed in text format on /metrics
+PIPELINE_STAGE_SECONDS = Histogram(
+    'cameo_pipeline_stage_seconds',
+    'Time spent in each stage of the face processing pipeline',
+    ['stage'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+FACES_PER_IMAGE = Histogram(
+    'cameo_faces_per_image',
+    'Number of faces detected per processed image',
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+PROCESSING_QUEUE_DEPTH = Gauge(
+    'cameo_processing_queue_depth',
+    'Images claimed by this process and not finished yet'
+)
+# The whole backlog, across all events and processes; refreshed from Mongo on
+# every scrape (and by idle workers), so it says whether to add workers
+PENDING_IMAGES = Gauge('cameo_pending_images', 'Images not processed yet')
+IMAGES_PROCESSED = Counter('cameo_images_processed_total', 'Images run through face processing')
+FACES_DETECTED = Counter('cameo_faces_detected_total', 'Faces detected in processed images')
+USER_MATCHES = Counter('cameo_user_matches_total', 'Image-to-user matches produced')
+IMAGES_UPLOADED = Counter('cameo_images_uploaded_total', 'Images uploaded through the admin API')
+IMAGES_INGESTED = Counter('cameo_images_ingested_total', 'Images registered from the hot folder')
+USERS_REGISTERED = Counter('cameo_users_registered_total', 'Users registered with a face encoding')
+SSE_SUBSCRIBERS = Gauge('cameo_sse_subscribers', 'Connected Server-Sent Events subscribers')
+SSE_DROPPED = Counter('cameo_sse_dropped_total', 'Events dropped because a subscriber fell behind')
+ADMISSION_REJECTED = Counter(
+    'cameo_admission_rejected_total',
+    'Public requests rejected by admission control',
+    ['route_class', 'reason']
+)
+MODELS_READY = Gauge('cameo_face_models_ready', 'Whether the face models are loaded and warm')
+MODEL_LOAD_SECONDS = Gauge('cameo_face_models_load_seconds', 'Time taken to load and warm the face models')
+HTTP_REQUEST_SECONDS = Histogram(
+    'cameo_http_request_seconds',
+    'API request latency by route',
+    ['method', 'route', 'status']
+)
+
+@contextmanager
+def observe_stage(stage: str):
+    """Record the wall time of a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        PIPELINE_STAGE_SECONDS.labels(stage=stage).observe(time.perf_counter() - start)
+
+# Fire-and-forget tasks. The event loop only keeps weak references to tasks,
+# so one nobody holds could be garbage-collected before it finishes.
+_background_tasks: set = set()
+
+def spawn(coro) -> asyncio.Task:
+    """Run a coroutine in the background, keeping it alive until it is done"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+class EventBroadcaster:
+    """Fans pipeline events out to Server-Sent Events subscribers by topic.
+
+    Each subscriber owns a bounded queue. Publishing never blocks the pipeline:
+    a subscriber that falls behind has its backlog dropped and receives a
+    ``resync`` event telling it to refetch state once.
+
+    With ``shared`` set (multi-process deployments) events are written to the
+    ``pipeline_events`` collection instead, and every API process delivers them
+    to its own subscribers via ``relay_pipeline_events``.
+    """
+
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, shared: bool = False):
+        self.queue_size = max(2, queue_size)
+        self.shared = shared
+        self._subscribers: dict = {}
+
+    def subscribe(self, topic: str) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(topic, set()).add(queue)
+        SSE_SUBSCRIBERS.inc()
+        return queue
+
+    def unsubscribe(self, topic: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(topic)
+        if subscribers and queue in subscribers:
+            subscribers.discard(queue)
+            SSE_SUBSCRIBERS.dec()
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def publish(self, topic: str, event: dict):
+        """Publish an event to a topic (call from the event loop)"""
+        if self.shared:
+            spawn(self._store(topic, event))
+        else:
+            self.deliver(topic, event)
+
+    async def _store(self, topic: str, event: dict):
+        try:
+            await db.pipeline_events.insert_one({
+                "topic": topic,
+                "event": event,
+                "created_at": datetime.now(timezone.utc)
+            })
+        except Exception as e:
+            logger.warning(f"Could not store pipeline event: {e}")
+
+    def deliver(self, topic: str, event: dict):
+        """Queue an event for every local subscriber of a topic"""
+        subscribers = self._subscribers.get(topic)
+        if not subscribers:
+            return
+        # Serialize once, however many subscribers there are
+        message = f"data: {json.dumps(event)}\n\n"
+        for queue in list(subscribers):
+            if queue.full():
+                SSE_DROPPED.inc(queue.qsize())
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(f"data: {json.dumps({'type': 'resync'})}\n\n")
+            queue.put_nowait(message)
+
+    def publish_admin(self, event_id: str, event: dict):
+        """Publish to the global admin topic and the event's own admin topic"""
+        self.publish('admin', event)
+        self.publish(f'admin:{event_id}', event)
+
+broadcaster = EventBroadcaster(shared=PROCESSING_MODE == 'worker')
+
+# Object storage for originals and user galleries
+if STORAGE_BACKEND == 's3':
+    storage = S3Storage(
+        bucket=getenv_strip('S3_BUCKET'),
+        prefix=getenv_strip('S3_PREFIX') or '',
+        endpoint_url=getenv_strip('S3_ENDPOINT_URL'),
+        region=getenv_strip('S3_REGION'),
+        max_pool_connections=int(getenv_strip('S3_MAX_POOL_CONNECTIONS') or 50),
+        multipart_threshold=int(getenv_strip('S3_MULTIPART_THRESHOLD_MB') or 8) * 1024 * 1024,
+        presign_expiry=int(getenv_strip('S3_PRESIGN_EXPIRY') or 3600),
+        temp_dir=TEMP_DIR
+    )
+else:
+    storage = LocalStorage(UPLOAD_DIR)
+
+# Admission control for the public endpoints (see admission.py). Costs are in
+# tokens; a registration (face encoding) costs as much as 10 gallery reads.
+RATE_LIMIT_ENABLED = (getenv_strip('RATE_LIMIT_ENABLED') or '1').lower() in ('1', 'true', 'yes')
+RATE_LIMIT_CLIENT_RPS = float(getenv_strip('RATE_LIMIT_CLIENT_RPS') or 20)
+RATE_LIMIT_CLIENT_BURST = float(getenv_strip('RATE_LIMIT_CLIENT_BURST') or 100)
+RATE_LIMIT_GLOBAL_RPS = float(getenv_strip('RATE_LIMIT_GLOBAL_RPS') or 500)
+RATE_LIMIT_GLOBAL_BURST = float(getenv_strip('RATE_LIMIT_GLOBAL_BURST') or 1000)
+# Share of the global bucket only gallery reads may use
+RATE_LIMIT_PRIORITY_RESERVE = float(getenv_strip('RATE_LIMIT_PRIORITY_RESERVE') or 0.2)
+# Registrations never hold more than half the processing threads
+REGISTER_CONCURRENCY = int(getenv_strip('REGISTER_CONCURRENCY') or max(1, PROCESSING_WORKERS // 2))
+GALLERY_CONCURRENCY = int(getenv_strip('GALLERY_CONCURRENCY') or 64)
+QRCODE_CONCURRENCY = int(getenv_strip('QRCODE_CONCURRENCY') or 4)
+# Header carrying the real client address when behind a proxy (e.g. X-Real-IP)
+CLIENT_IP_HEADER = getenv_strip('CLIENT_IP_HEADER')
+# Per-client buckets need real client addresses: behind a proxy without
+# CLIENT_IP_HEADER every guest would share the proxy's bucket. Set to 1 only
+# when clients connect directly.
+RATE_LIMIT_PER_CLIENT = (getenv_strip('RATE_LIMIT_PER_CLIENT') or ('1' if CLIENT_IP_HEADER else '0')).lower() in ('1', 'true', 'yes')
+# Gallery photos are fetched all at once by the gallery page, so they are not
+# rate limited per request; only this many are served at a time
+IMAGE_CONCURRENCY = int(getenv_strip('IMAGE_CONCURRENCY') or 256)
+
+register_class = RouteClass('register', cost=10, limit=REGISTER_CONCURRENCY,
+                            max_waiting=2 * REGISTER_CONCURRENCY, wait_timeout=2.0)
+gallery_class = RouteClass('gallery', cost=1, limit=GALLERY_CONCURRENCY,
+                           max_waiting=GALLERY_CONCURRENCY, wait_timeout=1.0, priority=True)
+qrcode_class = RouteClass('qrcode', cost=2, limit=QRCODE_CONCURRENCY,
+                          max_waiting=2 * QRCODE_CONCURRENCY, wait_timeout=1.0)
+image_class = RouteClass('image', limit=IMAGE_CONCURRENCY, max_waiting=4 * IMAGE_CONCURRENCY,
+                         wait_timeout=10.0, rate_limited=False)
+stream_class = RouteClass('stream', cost=1)
+admission = AdmissionController(
+    routes=[
+        ('POST', '/api/register', register_class),
+        ('POST', '/api/gallery/', register_class),  # adding a selfie encodes a face too
+        ('GET', '/api/gallery/', gallery_class),
+        ('GET', '/api/image/', image_class),
+        ('GET', '/api/qrcode/', qrcode_class),
+        ('GET', '/api/stream/gallery/', stream_class),
+    ],
+    client_buckets=ClientBuckets(RATE_LIMIT_CLIENT_RPS, RATE_LIMIT_CLIENT_BURST) if RATE_LIMIT_PER_CLIENT else None,
+    global_bucket=TokenBucket(RATE_LIMIT_GLOBAL_RPS, RATE_LIMIT_GLOBAL_BURST),
+    priority_reserve=RATE_LIMIT_PRIORITY_RESERVE,
+    on_reject=lambda route_class, reason: ADMISSION_REJECTED.labels(route_class=route_class, reason=reason).inc(),
+    enabled=RATE_LIMIT_ENABLED
+)
+
+# Thread pool for face detection/encoding so the event loop stays responsive
+processing_executor = ThreadPoolExecutor(max_workers=PROCESSING_WORKERS, thread_name_prefix="face-proc")
+delete_executor = ThreadPoolExecutor(max_workers=DELETE_WORKERS, thread_name_prefix="delete")
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -99,6 +379,8 @@ class UserRegistration(BaseModel):
     email: EmailStr
     phone: str
     face_image_data: str  # base64 encoded image
+    additional_face_images: List[str] = []  # extra base64 selfies for better recall
+    event_id: Optional[str] = None  # defaults to DEFAULT_EVENT_ID
 
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -108,18 +390,46 @@ class User(BaseModel):
     email: str
     phone: str
     gallery_id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
-    face_encoding: List[float]
+    event_id: str = DEFAULT_EVENT_ID
+    face_encoding: bytes  # packed float32 template centroid, see pack_encoding
+    reference_encodings: List[bytes] = []  # packed float32 references the centroid is built from
+    selfie_count: int = 1  # leading references supplied by the user; the rest are auto-enrolled
+    template_radius: float = 0.0  # max distance from the centroid to any reference
+    encoding_model: str = ENCODING_MODEL
     created_at: str
 
 class ImageMetadata(BaseModel):
     model_config = ConfigDict(extra="ignore")
     
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    event_id: str = DEFAULT_EVENT_ID
     filename: str
     original_path: str
     upload_date: str
     processed: bool = False
     user_matches: List[str] = []  # List of user IDs
+    faces: List[dict] = []  # detected faces: box (top, right, bottom, left) and packed encoding
+    matches: List[dict] = []  # user_id, face_index, distance and box for each assigned face
+    captured_at: Optional[str] = None  # EXIF capture time, used to order galleries
+
+class EventCreate(BaseModel):
+    name: str
+    event_id: Optional[str] = None  # generated when omitted
+
+class Event(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4())[:8])
+    name: str
+    created_at: str
+
+class FaceEnrollment(BaseModel):
+    face_image_data: str  # base64 encoded image
+
+class PurgeRequest(BaseModel):
+    image_ids: List[str] = []
+    user_ids: List[str] = []
+    event_id: Optional[str] = None  # purge the whole event: images, users and the event itself
 
 class AdminUser(BaseModel):
     email: str
@@ -136,30 +446,407 @@ class DashboardStats(BaseModel):
     pending_images: int
 
 # Helper Functions
+def resolve_event_id(event_id: Optional[str]) -> str:
+    """Normalize an optional event id, falling back to the default event"""
+    event_id = (event_id or '').strip()
+    if not event_id:
+        return DEFAULT_EVENT_ID
+    # Event ids become directory names, so keep them to a safe character set
+    if not EVENT_ID_PATTERN.fullmatch(event_id):
+        raise HTTPException(status_code=400, detail="Invalid event id")
+    return event_id
+
+def event_query(event_id: str) -> dict:
+    """Mongo filter selecting documents of an event (legacy docs have no event_id)"""
+    if event_id == DEFAULT_EVENT_ID:
+        return {"event_id": {"$in": [DEFAULT_EVENT_ID, None]}}
+    return {"event_id": event_id}
+
+def get_event_original_prefix(event_id: str) -> str:
+    """Storage prefix holding the uploaded originals of an event"""
+    if event_id == DEFAULT_EVENT_ID:
+        return 'original'
+    return f'events/{event_id}/original'
+
+def get_event_users_prefix(event_id: str) -> str:
+    """Storage prefix holding the per-user galleries of an event"""
+    if event_id == DEFAULT_EVENT_ID:
+        return 'users'
+    return f'events/{event_id}/users'
+
+def get_original_key(event_id: str, filename: str) -> str:
+    return f"{get_event_original_prefix(event_id)}/{filename}"
+
+def get_gallery_key(event_id: str, gallery_id: str, filename: str = '') -> str:
+    return f"{get_event_users_prefix(event_id)}/{gallery_id}/{filename}".rstrip('/')
+
+def original_local_copy(image_doc: dict):
+    """Context manager yielding a local path for an image's original.
+
+    Uploaded images live in storage under ``storage_key``; hot-folder images
+    (and uploads made before storage keys existed) only have ``original_path``.
+    """
+    if image_doc.get('storage_key'):
+        return storage.local_copy(image_doc['storage_key'])
+    return LocalStorage(Path(image_doc['original_path']).parent).local_copy(Path(image_doc['original_path']).name)
+
+async def ensure_event_exists(event_id: str):
+    """Raise 404 unless the event is the default one or has been created"""
+    if event_id == DEFAULT_EVENT_ID:
+        return
+    if not await db.events.find_one({"id": event_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Event not found")
+
+def pack_encoding(encoding) -> Binary:
+    """Pack a face encoding into a compact float32 BSON binary"""
+    return Binary(np.asarray(encoding, dtype=ENCODING_DTYPE).tobytes())
+
+def unpack_encoding(value) -> np.ndarray:
+    """Decode a stored encoding; blobs are viewed zero-copy, legacy arrays are converted"""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype=ENCODING_DTYPE)
+    return np.asarray(value, dtype=ENCODING_DTYPE)
+
+async def migrate_face_encodings(batch_size: int = 500) -> int:
+    """Convert users still storing face_encoding as a BSON array of doubles"""
+    migrated = 0
+    cursor = db.users.find({"face_encoding": {"$type": "array"}}, {"_id": 1, "event_id": 1, "face_encoding": 1})
+    ops = []
+    events = set()
+    async for user in cursor:
+        ops.append(UpdateOne(
+            {"_id": user['_id']},
+            {"$set": {"face_encoding": pack_encoding(user['face_encoding']), "encoding_model": ENCODING_MODEL}}
+        ))
+        events.add(resolve_event_id(user.get('event_id')))
+        if len(ops) >= batch_size:
+            await db.users.bulk_write(ops, ordered=False)
+            migrated += len(ops)
+            ops = []
+    if ops:
+        await db.users.bulk_write(ops, ordered=False)
+        migrated += len(ops)
+    for event_id in events:
+        await invalidate_event_encoding_index(event_id)
+    return migrated
+
+def build_face_template(references: List[np.ndarray]) -> tuple:
+    """Summarize reference encodings as (centroid, radius)"""
+    refs = np.stack(references).astype(ENCODING_DTYPE)
+    centroid = refs.mean(axis=0)
+    radius = float(np.linalg.norm(refs - centroid, axis=1).max())
+    return centroid, radius
+
+def face_template_fields(references: List[np.ndarray], selfie_count: Optional[int] = None) -> dict:
+    """User document fields describing a set of reference encodings.
+
+    References are ordered selfies first; the first ``selfie_count`` were
+    supplied by the user, the rest were auto-enrolled from event photos.
+    """
+    centroid, radius = build_face_template(references)
+    return {
+        "face_encoding": pack_encoding(centroid),
+        "reference_encodings": [pack_encoding(r) for r in references],
+        "selfie_count": len(references) if selfie_count is None else selfie_count,
+        "template_radius": radius,
+        "encoding_model": ENCODING_MODEL
+    }
+
+async def add_reference_encoding(user_id: str, encoding, auto: bool = False) -> Optional[int]:
+    """Add a reference encoding to a user and rebuild their template.
+
+    Auto-enrolled encodings are only added while the user has room and never
+    displace anything. A new selfie displaces the oldest auto-enrolled
+    reference first, then the oldest extra selfie; the registration selfie is
+    always kept. The update is a compare-and-set on ``reference_version`` so
+    concurrent workers cannot lose each other's changes. Returns the new
+    reference count, or None if nothing was added.
+    """
+    encoding = np.asarray(encoding, dtype=ENCODING_DTYPE)
+    while True:
+        user = await db.users.find_one(
+            {"id": user_id},
+            {"_id": 0, "event_id": 1, "face_encoding": 1, "reference_encodings": 1,
+             "selfie_count": 1, "reference_version": 1}
+        )
+        if not user:
+            return None
+        references = [unpack_encoding(r) for r in user.get('reference_encodings') or [user['face_encoding']]]
+        # Documents written before selfie_count existed only hold user selfies
+        selfies = min(user.get('selfie_count') or len(references), len(references))
+        if auto:
+            if len(references) >= MAX_REFERENCE_ENCODINGS:
+                return None
+            references.append(encoding)
+        else:
+            references.insert(selfies, encoding)
+            selfies += 1
+            if len(references) > MAX_REFERENCE_ENCODINGS:
+                # Oldest auto-enrolled reference, else the oldest extra selfie
+                references.pop(selfies if len(references) > selfies else 1)
+                selfies = min(selfies, len(references))
+        
+        result = await db.users.update_one(
+            {"id": user_id, "reference_version": user.get('reference_version')},
+            {"$set": face_template_fields(references, selfies), "$inc": {"reference_version": 1}}
+        )
+        if result.matched_count:
+            break
+    await invalidate_event_encoding_index(resolve_event_id(user.get('event_id')))
+    return len(references)
+
+def assign_faces(distances: np.ndarray, tolerance: float = MATCH_TOLERANCE,
+                 method: str = MATCH_ASSIGNMENT) -> List[tuple]:
+    """Assign faces to users one-to-one from a users x faces distance matrix.
+
+    Returns (user position, face index, distance) for every pair kept under the
+    tolerance, so look-alike users can no longer share the same detected face.
+    """
+    candidates = distances <= tolerance
+    rows = np.flatnonzero(candidates.any(axis=1))
+    if not rows.size:
+        return []
+    
+    if method == 'hungarian':
+        try:
+            from scipy.optimize import linear_sum_assignment
+        except Exception as ie:
+            logger.warning(f"scipy not available for hungarian assignment, using greedy: {ie}")
+        else:
+            # Only users with at least one candidate face take part
+            cost = np.where(candidates[rows], distances[rows], tolerance + 1.0)
+            user_idx, face_idx = linear_sum_assignment(cost)
+            return [(int(rows[u]), int(f), float(distances[rows[u], f]))
+                    for u, f in zip(user_idx, face_idx) if candidates[rows[u], f]]
+    
+    # Greedy: closest pairs first, each user and each face used at most once
+    pairs = np.argwhere(candidates)
+    order = np.argsort(distances[pairs[:, 0], pairs[:, 1]], kind='stable')
+    used_users, used_faces, assigned = set(), set(), []
+    for user, face in pairs[order]:
+        if user in used_users or face in used_faces:
+            continue
+        used_users.add(user)
+        used_faces.add(face)
+        assigned.append((int(user), int(face), float(distances[user, face])))
+    return assigned
+
+class EventEncodingIndex:
+    """Face templates of all users of one event stacked into a single matrix.
+
+    Each user is summarized by the centroid of their reference encodings and a
+    radius. By the triangle inequality the closest reference to a face lies
+    within ``centroid distance +/- radius``, so the centroid pass alone decides
+    most pairs and only borderline ones are checked against the full set.
+    """
+
+    def __init__(self, users: List[dict]):
+        self.user_ids = [u['id'] for u in users]
+        self.gallery_ids = [u['gallery_id'] for u in users]
+        self.names = [u.get('name', '') for u in users]
+        self.version = 0  # users version this index was built from
+        self.radii = np.array([u.get('template_radius') or 0.0 for u in users], dtype=ENCODING_DTYPE)
+        self.ref_counts = [len(u.get('reference_encodings') or ()) or 1 for u in users]
+        # Full reference sets, only for users with more than one reference
+        self.references = {
+            pos: np.stack([unpack_encoding(r) for r in u['reference_encodings']])
+            for pos, u in enumerate(users) if len(u.get('reference_encodings') or ()) > 1
+        }
+        if users and all(isinstance(u['face_encoding'], bytes) for u in users):
+            # One memcpy of the packed blobs, then a zero-copy float32 view
+            blob = b''.join(u['face_encoding'] for u in users)
+            self.encodings = np.frombuffer(blob, dtype=ENCODING_DTYPE).reshape(len(users), ENCODING_DIM)
+        elif users:
+            self.encodings = np.stack([unpack_encoding(u['face_encoding']) for u in users])
+        else:
+            self.encodings = np.empty((0, ENCODING_DIM), dtype=ENCODING_DTYPE)
+        # Cached squared norms let distances be computed with one matrix product
+        self.sq_norms = np.einsum('ij,ij->i', self.encodings, self.encodings)
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def match(self, face_encodings: List[List[float]], tolerance: float = MATCH_TOLERANCE) -> List[int]:
+        """Return positions of users assigned to any of the given face encodings"""
+        return [pos for pos, _, _ in self.assign(face_encodings, tolerance)]
+
+    def assign(self, face_encodings: List[List[float]], tolerance: float = MATCH_TOLERANCE) -> List[tuple]:
+        """Return (user position, face index, distance), each face given to at most one user"""
+        if not face_encodings or not len(self):
+            return []
+        faces = np.asarray(face_encodings, dtype=ENCODING_DTYPE)
+        return assign_faces(self.template_distances(faces, tolerance), tolerance)
+
+    def template_distances(self, faces: np.ndarray, tolerance: float = MATCH_TOLERANCE) -> np.ndarray:
+        """users x faces distances, refined to the closest reference for borderline pairs"""
+        distances = self.distances(faces)
+        if not self.references:
+            return distances
+        radii = self.radii[:, None]
+        borderline = (distances - radii <= tolerance) & (distances + radii > tolerance)
+        for pos, face in zip(*np.nonzero(borderline)):
+            refs = self.references.get(int(pos))
+            if refs is not None:
+                distances[pos, face] = np.linalg.norm(refs - faces[face], axis=1).min()
+        return distances
+
+    def distances(self, faces: np.ndarray) -> np.ndarray:
+        """users x faces centroid distance matrix via |a|^2 + |b|^2 - 2ab"""
+        sq = self.sq_norms[:, None] + np.einsum('ij,ij->i', faces, faces)[None, :] - 2.0 * (self.encodings @ faces.T)
+        return np.sqrt(np.maximum(sq, 0.0))
+
+# Per-event encoding indexes, built lazily. Each event has a users version in
+# Mongo, bumped on every change, so processes sharing the database (API and
+# workers) notice each other's registrations and deletions.
+_encoding_indexes: dict = {}
+
+async def get_event_users_version(event_id: str) -> int:
+    doc = await db.index_versions.find_one({"event_id": event_id}, {"_id": 0, "version": 1})
+    return doc['version'] if doc else 0
+
+async def get_event_encoding_index(event_id: str) -> EventEncodingIndex:
+    """Load (or reuse) the encoding index for an event"""
+    version = await get_event_users_version(event_id)
+    index = _encoding_indexes.get(event_id)
+    if index is None or index.version != version:
+        users = await db.users.find(
+            event_query(event_id),
+            {"_id": 0, "id": 1, "gallery_id": 1, "name": 1, "face_encoding": 1,
+             "reference_encodings": 1, "template_radius": 1}
+        ).to_list(None)
+        index = EventEncodingIndex(users)
+        index.version = version
+        _encoding_indexes[event_id] = index
+    return index
+
+async def invalidate_event_encoding_index(event_id: str):
+    """Drop the cached encoding index of an event, here and in every other process"""
+    _encoding_indexes.pop(event_id, None)
+    await db.index_versions.update_one({"event_id": event_id}, {"$inc": {"version": 1}}, upsert=True)
+
+class FaceModels:
+    """face_recognition/dlib, loaded once per process.
+
+    Importing face_recognition loads the dlib models, which takes seconds, and
+    the first inference allocates more. ``load`` does both up front (at API
+    startup or worker init) so no request pays for it; hot paths then use the
+    loaded modules instead of importing inside every call. The native libraries
+    stay optional: if they are missing the models are reported unavailable.
+    """
+
+    def __init__(self):
+        self.state = 'cold'
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.face_recognition = None
+        self.dlib = None
+        self.face_encoder = None
+        self.raw_face_landmarks = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def load(self) -> bool:
+        """Load and warm the models if needed; returns whether they are usable"""
+        if self.state == 'ready':
+            return True
+        with self._lock:
+            if self.state in ('ready', 'unavailable'):
+                return self.ready
+            self.state = 'loading'
+            start = time.perf_counter()
+            try:
+                import dlib
+                import face_recognition
+                from face_recognition.api import face_encoder, _raw_face_landmarks
+                # One throwaway inference so the first real photo isn't slower
+                blank = np.zeros((FACE_CHIP_SIZE, FACE_CHIP_SIZE, 3), dtype=np.uint8)
+                face_recognition.face_locations(blank)
+                face_encoder.compute_face_descriptor(blank)
+                self.face_recognition = face_recognition
+                self.dlib = dlib
+                self.face_encoder = face_encoder
+                self.raw_face_landmarks = _raw_face_landmarks
+                self.state = 'ready'
+            except Exception as e:
+                self.state = 'unavailable'
+                self.error = str(e)
+                logger.error(f"Face models unavailable: {e}")
+            self.load_seconds = time.perf_counter() - start
+            MODELS_READY.set(1 if self.ready else 0)
+            MODEL_LOAD_SECONDS.set(self.load_seconds)
+            if self.ready:
+                logger.info(f"Face models ready in {self.load_seconds:.2f}s")
+            return self.ready
+
+face_models = FaceModels()
+
+EXIF_IFD = 0x8769
+EXIF_DATETIME = 0x0132
+EXIF_DATETIME_ORIGINAL = 0x9003
+EXIF_OFFSET_TIME_ORIGINAL = 0x9011
+
+def exif_capture_time(exif: Image.Exif) -> Optional[str]:
+    """ISO capture time from EXIF (camera local time, with offset when recorded)"""
+    sub = exif.get_ifd(EXIF_IFD)
+    value = sub.get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+    if not value:
+        return None
+    try:
+        captured = datetime.strptime(str(value).strip('\x00 '), '%Y:%m:%d %H:%M:%S')
+    except ValueError:
+        return None
+    offset = sub.get(EXIF_OFFSET_TIME_ORIGINAL)
+    if offset and re.fullmatch(r'[+-]\d{2}:\d{2}', str(offset).strip('\x00 ')):
+        return captured.isoformat() + str(offset).strip('\x00 ')
+    return captured.isoformat()
+
+def load_image(source: Union[str, Path, BinaryIO], max_side: int = 0) -> Tuple[np.ndarray, dict]:
+    """Decode a photo to an upright RGB array no larger than ``max_side``.
+
+    JPEGs use libjpeg DCT scaling (draft mode) so a 24MP photo is never fully
+    decoded when detection only needs ~2MP; the result may be slightly smaller
+    than ``max_side``. EXIF orientation is applied. Returns
+    the array and ``{"scale", "captured_at"}``, where ``scale`` maps upright
+    full-resolution coordinates to array coordinates.
+    """
+    with Image.open(source) as img:
+        exif = img.getexif()
+        captured_at = exif_capture_time(exif)
+        full_size = img.size
+        if max_side and max(full_size) > max_side and img.format == 'JPEG':
+            # Accept a DCT scale landing up to 15% under max_side: that skips a
+            # resize which costs about as much as the scaled decode itself
+            ratio = 0.85 * max_side / max(full_size)
+            img.draft('RGB', (int(full_size[0] * ratio), int(full_size[1] * ratio)))
+        upright = ImageOps.exif_transpose(img)
+        upright = upright.convert('RGB')
+    if upright.size != img.size:
+        # Rotated by 90/270 degrees
+        full_size = full_size[::-1]
+    if max_side and max(upright.size) > max_side:
+        ratio = max_side / max(upright.size)
+        upright = upright.resize((round(upright.width * ratio), round(upright.height * ratio)), Image.BILINEAR)
+    scale = upright.width / full_size[0]
+    return np.asarray(upright), {"scale": scale, "captured_at": captured_at}
+
 def encode_face_from_base64(base64_data: str) -> Optional[List[float]]:
     """Extract face encoding from base64 image data"""
     try:
-        # Lazy imports to avoid requiring heavy native deps at import-time
-        try:
-            import face_recognition
-            import cv2
-        except Exception as ie:
-            logger.error(f"Required image libraries missing: {ie}")
+        if not face_models.load():
             return None
         # Remove data URL prefix if present
         if 'base64,' in base64_data:
             base64_data = base64_data.split('base64,')[1]
         
-        # Decode base64 to image
+        # Decode base64 to an upright RGB image
         img_bytes = base64.b64decode(base64_data)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Convert BGR to RGB
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        rgb_image, _ = load_image(io.BytesIO(img_bytes), DETECTION_MAX_SIDE)
         
         # Get face encodings
-        face_encodings = face_recognition.face_encodings(rgb_image)
+        face_encodings = face_models.face_recognition.face_encodings(rgb_image)
         
         if len(face_encodings) > 0:
             return face_encodings[0].tolist()
@@ -168,116 +855,693 @@ def encode_face_from_base64(base64_data: str) -> Optional[List[float]]:
         logger.error(f"Error encoding face: {e}")
         return None
 
-def process_image_for_faces(image_path: str) -> List[List[float]]:
-    """Extract all face encodings from an image"""
+def encode_selfies(selfies: List[str]) -> List[Optional[List[float]]]:
+    """Encode a registration's selfies one after another.
+
+    Runs as a single executor job, so a registration holds one processing
+    thread however many selfies it sends. Stops after the first selfie when
+    it has no face, since the registration is refused anyway.
+    """
+    encodings = []
+    for data in selfies:
+        encodings.append(encode_face_from_base64(data))
+        if not encodings[0]:
+            break
+    return encodings
+
+def extract_face_chips(image: np.ndarray, face_locations: list) -> Optional[List[np.ndarray]]:
+    """Align each face to a FACE_CHIP_SIZE square chip, the same way dlib does before encoding"""
     try:
-        # Lazy import
+        landmarks = face_models.raw_face_landmarks(image, face_locations, model="small")
+        return [face_models.dlib.get_face_chip(image, shape, size=FACE_CHIP_SIZE, padding=FACE_CHIP_PADDING)
+                for shape in landmarks]
+    except Exception as e:
+        logger.warning(f"Face alignment unavailable: {e}")
+        return None
+
+def get_face_crop_prefix(image_id: str) -> str:
+    """Storage prefix holding an image's face chips (shared by all replicas and workers)"""
+    return f"faces/{image_id}"
+
+def get_face_crop_key(image_id: str, face_index: int) -> str:
+    return f"{get_face_crop_prefix(image_id)}/{face_index}.jpg"
+
+def save_face_crops(image: np.ndarray, face_locations: list, chips: Optional[List[np.ndarray]], crop_prefix: str):
+    """Store one chip per face as <face_index>.jpg; unaligned box crops if alignment failed"""
+    for i, (top, right, bottom, left) in enumerate(face_locations):
+        if chips:
+            chip = Image.fromarray(chips[i])
+        else:
+            chip = Image.fromarray(image[max(top, 0):bottom, max(left, 0):right])
+            chip = chip.resize((FACE_CHIP_SIZE, FACE_CHIP_SIZE))
+        buffer = io.BytesIO()
+        chip.save(buffer, format='JPEG', quality=90)
+        buffer.seek(0)
+        storage.save(f"{crop_prefix}/{i}.jpg", buffer)
+
+def encode_face_chips(chip_keys: List[str], num_jitters: int = 1) -> List[Optional[List[float]]]:
+    """Re-encode cached face chips without touching the original photos"""
+    if not face_models.load():
+        return [None] * len(chip_keys)
+    encodings = []
+    for key in chip_keys:
         try:
-            import face_recognition
-        except Exception as ie:
-            logger.error(f"face_recognition not available: {ie}")
-            return []
-        image = face_recognition.load_image_file(image_path)
-        face_encodings = face_recognition.face_encodings(image)
-        return [encoding.tolist() for encoding in face_encodings]
+            with storage.local_copy(key) as path:
+                chip = np.asarray(Image.open(path).convert('RGB'))
+            encodings.append(list(face_models.face_encoder.compute_face_descriptor(chip, num_jitters)))
+        except Exception as e:
+            logger.error(f"Error encoding face chip {key}: {e}")
+            encodings.append(None)
+    return encodings
+
+def analyze_image(image_path: str, crop_prefix: Optional[str] = None) -> Tuple[List[dict], dict]:
+    """Detect faces in an image, returning each face's encoding and box plus the image metadata.
+
+    Boxes (top, right, bottom, left) are in upright full-resolution pixels.
+    When ``crop_prefix`` is given, aligned face chips are also stored there and
+    the encodings are computed from those same chips.
+    """
+    try:
+        if not face_models.load():
+            return [], {}
+        face_recognition = face_models.face_recognition
+        with observe_stage('load'):
+            image, meta = load_image(image_path, DETECTION_MAX_SIDE)
+        with observe_stage('detect'):
+            face_locations = face_recognition.face_locations(image)
+        with observe_stage('encode'):
+            chips = extract_face_chips(image, face_locations) if crop_prefix is not None and face_locations else None
+            if chips is not None:
+                face_encodings = [np.array(face_models.face_encoder.compute_face_descriptor(chip)) for chip in chips]
+            else:
+                face_encodings = face_recognition.face_encodings(image, known_face_locations=face_locations)
+        if crop_prefix is not None and face_locations:
+            with observe_stage('crop'):
+                save_face_crops(image, face_locations, chips, crop_prefix)
+        faces = [
+            {"encoding": encoding.tolist(), "box": [int(round(v / meta['scale'])) for v in location]}
+            for encoding, location in zip(face_encodings, face_locations)
+        ]
+        return faces, meta
     except Exception as e:
         logger.error(f"Error processing image {image_path}: {e}")
-        return []
+        return [], {}
 
-def compare_faces(known_encoding: List[float], unknown_encodings: List[List[float]], tolerance: float = 0.6) -> bool:
-    """Compare a known face encoding with multiple unknown encodings"""
-    if not unknown_encodings:
-        return False
-    known_np = np.array(known_encoding)
-    unknown_np = [np.array(enc) for enc in unknown_encodings]
+def detect_faces(image_path: str, crop_prefix: Optional[str] = None) -> List[dict]:
+    """Detect faces in an image, returning each face's encoding and box"""
+    return analyze_image(image_path, crop_prefix)[0]
 
-    try:
-        import face_recognition
-    except Exception as ie:
-        logger.error(f"face_recognition not available for compare: {ie}")
-        return False
+def process_image_for_faces(image_path: str) -> List[List[float]]:
+    """Extract all face encodings from an image"""
+    return [face['encoding'] for face in detect_faces(image_path)]
 
-    matches = face_recognition.compare_faces(unknown_np, known_np, tolerance=tolerance)
-    return any(matches)
+async def process_event_images(event_id: str, image_docs: List[dict], on_image_done=None):
+    """Match a batch of one event's images against that event's users only.
 
-async def process_images_background():
-    """Background task to process unprocessed images"""
-    try:
-        # Get all unprocessed images (limit to 100 per batch for performance)
-        unprocessed = await db.images.find({"processed": False}).limit(100).to_list(100)
-        logger.info(f"Processing {len(unprocessed)} images")
-        
-        # Get all registered users (limit to 1000 for performance)
-        users = await db.users.find({}).limit(1000).to_list(1000)
-        logger.info(f"Matching against {len(users)} registered users")
+    ``on_image_done`` is called once for every image that was attempted.
+    """
+    index = await get_event_encoding_index(event_id)
+    logger.info(f"Event {event_id}: processing {len(image_docs)} images against {len(index)} users")
+    
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(EVENT_PROCESSING_CONCURRENCY)
+    
+    async def process_one(image_doc: dict):
+        async with semaphore:
+            try:
+                await process_one_image(image_doc)
+            finally:
+                if on_image_done:
+                    on_image_done()
+    
+    async def process_one_image(image_doc: dict):
+        # Extract face encodings from the image off the event loop
+        crop_prefix = get_face_crop_prefix(image_doc['id']) if FACE_CROPS else None
+        try:
+            faces, meta = await loop.run_in_executor(processing_executor, detect_faces_in_original, image_doc, crop_prefix)
+        except FileNotFoundError:
+            logger.error(f"Image not found: {image_doc['original_path']}")
+            attempts = image_doc.get('missing_attempts', 0) + 1
+            if image_doc.get('storage_key') or PROCESSING_MODE != 'worker' or attempts >= MISSING_ORIGINAL_ATTEMPTS:
+                # Gone from shared storage or from our own folder, or no worker could
+                # read it: mark it done so it is not re-claimed forever
+                await db.images.update_one(
+                    {"id": image_doc['id']},
+                    {"$set": {"processed": True, "error": "Original not found"}, "$unset": LEASE_FIELDS}
+                )
+            else:
+                # A host path may just not be visible to this worker; retry later
+                # (possibly on another one), backing off with each attempt
+                await db.images.update_one(
+                    {"id": image_doc['id']},
+                    {"$set": {"lease_owner": "",
+                              "lease_until": datetime.now(timezone.utc) + timedelta(seconds=WORKER_LEASE_SECONDS * attempts)},
+                     "$inc": {"missing_attempts": 1}}
+                )
+            return
+        face_encodings = [face['encoding'] for face in faces]
+        captured = {"captured_at": meta['captured_at']} if meta.get('captured_at') else {}
+        IMAGES_PROCESSED.inc()
+        FACES_PER_IMAGE.observe(len(face_encodings))
+        FACES_DETECTED.inc(len(face_encodings))
         
-        for image_doc in unprocessed:
-            image_path = image_doc['original_path']
-            
-            if not os.path.exists(image_path):
-                logger.error(f"Image not found: {image_path}")
-                continue
-            
-            # Extract face encodings from the image
-            face_encodings = process_image_for_faces(image_path)
-            
-            if not face_encodings:
-                logger.info(f"No faces found in {image_doc['filename']}")
+        if not face_encodings:
+            logger.info(f"No faces found in {image_doc['filename']}")
+            with observe_stage('db_write'):
                 await db.images.update_one(
                     {"id": image_doc['id']},
-                    {"$set": {"processed": True}}
+                    {"$set": {"processed": True, "faces": [], "matches": [], **captured}, "$unset": LEASE_FIELDS}
                 )
-                continue
+            publish_image_processed(image_doc, 0, [])
+            return
+        
+        matched_users = []
+        match_records = []
+        
+        with observe_stage('match'):
+            assignments = index.assign(face_encodings)
+        
+        for pos, face, distance in assignments:
+            matched_users.append(index.user_ids[pos])
+            match_records.append({
+                "user_id": index.user_ids[pos],
+                "face_index": face,
+                "distance": round(distance, 4),
+                "box": faces[face]['box']
+            })
             
-            matched_users = []
+            # Copy image to user's gallery
+            dest_key = get_gallery_key(event_id, index.gallery_ids[pos], image_doc['filename'])
+            with observe_stage('copy'):
+                await asyncio.to_thread(copy_to_gallery, image_doc, dest_key)
             
-            # Compare with each registered user
-            for user in users:
-                if compare_faces(user['face_encoding'], face_encodings):
-                    matched_users.append(user['id'])
-                    
-                    # Copy image to user's gallery
-                    user_gallery_dir = USERS_DIR / user['gallery_id']
-                    user_gallery_dir.mkdir(exist_ok=True)
-                    
-                    dest_path = user_gallery_dir / image_doc['filename']
-                    shutil.copy2(image_path, dest_path)
-                    
-                    logger.info(f"Matched {image_doc['filename']} to user {user['name']}")
+            broadcaster.publish(f"gallery:{index.gallery_ids[pos]}", {
+                "type": "photo_matched",
+                "filename": image_doc['filename'],
+                "url": f"/api/image/{index.gallery_ids[pos]}/{image_doc['filename']}"
+            })
+            logger.info(f"Matched {image_doc['filename']} to user {index.names[pos]}")
             
-            # Update image metadata
+            # Very confident matches from event photos refine the user's template
+            # (ref_counts is the batch snapshot; add_reference_encoding re-checks the live count)
+            if AUTO_ENROLL_DISTANCE and distance <= AUTO_ENROLL_DISTANCE \
+                    and index.ref_counts[pos] < MAX_REFERENCE_ENCODINGS:
+                count = await add_reference_encoding(index.user_ids[pos], face_encodings[face], auto=True)
+                index.ref_counts[pos] = count or MAX_REFERENCE_ENCODINGS
+        USER_MATCHES.inc(len(matched_users))
+        
+        # Update image metadata
+        with observe_stage('db_write'):
             await db.images.update_one(
                 {"id": image_doc['id']},
                 {"$set": {
                     "processed": True,
-                    "user_matches": matched_users
-                }}
+                    "user_matches": matched_users,
+                    # Encodings and scores are kept so tolerance tuning and
+                    # re-ranking can run offline without re-detecting faces
+                    "faces": [{"box": f['box'], "encoding": pack_encoding(f['encoding'])} for f in faces],
+                    "matches": match_records,
+                    **captured
+                }, "$unset": LEASE_FIELDS}
             )
+        publish_image_processed(image_doc, len(face_encodings), matched_users)
+    
+    def publish_image_processed(image_doc: dict, faces: int, matched_users: List[str]):
+        broadcaster.publish_admin(event_id, {
+            "type": "image_processed",
+            "image_id": image_doc['id'],
+            "event_id": event_id,
+            "filename": image_doc['filename'],
+            "faces": faces,
+            "user_matches": matched_users
+        })
+    
+    await asyncio.gather(*(process_one(doc) for doc in image_docs))
+
+def detect_faces_in_original(image_doc: dict, crop_prefix: Optional[str] = None) -> Tuple[List[dict], dict]:
+    """Run analyze_image on an image's original, fetching it from storage if needed"""
+    with original_local_copy(image_doc) as image_path:
+        return analyze_image(str(image_path), crop_prefix)
+
+def copy_to_gallery(image_doc: dict, dest_key: str):
+    """Copy an original into a user's gallery (server-side when both are in storage)"""
+    if image_doc.get('storage_key'):
+        storage.copy(image_doc['storage_key'], dest_key)
+    else:
+        storage.put_file(image_doc['original_path'], dest_key)
+
+# Work coordination: an image is processed by whoever holds its lease. Leases
+# are taken atomically with find_one_and_update and expire, so images claimed
+# by a crashed worker are picked up again by another one.
+LEASE_FIELDS = {"lease_owner": "", "lease_until": ""}
+
+def lease_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=WORKER_LEASE_SECONDS)
+
+async def claim_images(owner: str, limit: int, event_id: Optional[str] = None) -> List[dict]:
+    """Lease up to ``limit`` unprocessed images that nobody else holds"""
+    query = {
+        "processed": False,
+        "$or": [{"lease_until": None}, {"lease_until": {"$lt": datetime.now(timezone.utc)}}]
+    }
+    if event_id:
+        query.update(event_query(resolve_event_id(event_id)))
+    claimed = []
+    for _ in range(limit):
+        doc = await db.images.find_one_and_update(
+            query,
+            {"$set": {"lease_owner": owner, "lease_until": lease_expiry()}},
+            sort=[("upload_date", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not doc:
+            break
+        claimed.append(doc)
+    return claimed
+
+async def renew_leases(owner: str, image_ids: List[str]):
+    """Keep extending our leases while a batch is still being processed"""
+    while True:
+        await asyncio.sleep(WORKER_LEASE_SECONDS / 3)
+        await db.images.update_many(
+            {"id": {"$in": image_ids}, "lease_owner": owner, "processed": False},
+            {"$set": {"lease_until": lease_expiry()}}
+        )
+
+async def process_claimed_images(owner: str, claimed: List[dict]):
+    """Process leased images, one pipeline per event"""
+    PROCESSING_QUEUE_DEPTH.inc(len(claimed))
+    outstanding = [len(claimed)]
+    
+    def image_done():
+        outstanding[0] -= 1
+        PROCESSING_QUEUE_DEPTH.dec()
+    
+    by_event: dict = {}
+    for image_doc in claimed:
+        by_event.setdefault(resolve_event_id(image_doc.get('event_id')), []).append(image_doc)
+    
+    renewer = asyncio.create_task(renew_leases(owner, [doc['id'] for doc in claimed]))
+    try:
+        # Events are independent, so their batches run in parallel
+        results = await asyncio.gather(
+            *(process_event_images(eid, docs, image_done) for eid, docs in by_event.items()),
+            return_exceptions=True
+        )
+    finally:
+        renewer.cancel()
+        # Images never attempted (e.g. the event's index failed to load) leave the queue too
+        PROCESSING_QUEUE_DEPTH.dec(outstanding[0])
+    for eid, result in zip(by_event, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error processing event {eid}: {result}")
+        broadcaster.publish_admin(eid, {"type": "batch_complete", "event_id": eid, "count": len(by_event[eid])})
+
+async def refresh_pending_images():
+    try:
+        PENDING_IMAGES.set(await db.images.count_documents({"processed": False}))
+    except Exception as e:
+        logger.warning(f"Could not count pending images: {e}")
+
+async def process_images_background(event_id: Optional[str] = None):
+    """Background task to process unprocessed images in the API process"""
+    try:
+        # Claim unprocessed images (limit to 100 per batch for performance)
+        claimed = await claim_images(PROCESS_ID, 100, event_id)
+        logger.info(f"Processing {len(claimed)} images")
+        
+        if claimed:
+            await process_claimed_images(PROCESS_ID, claimed)
+        else:
+            broadcaster.publish('admin', {"type": "batch_complete", "event_id": event_id, "count": 0})
         
         logger.info("Image processing complete")
     except Exception as e:
         logger.error(f"Error in background processing: {e}")
 
+async def watch_for_new_images(wake: asyncio.Event):
+    """Wake an idle worker as soon as images are inserted (needs a replica set)"""
+    try:
+        async with db.images.watch([{"$match": {"operationType": "insert"}}]) as stream:
+            async for _ in stream:
+                wake.set()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.info(f"Change streams unavailable ({e}), polling every {WORKER_POLL_SECONDS}s")
+
+async def run_worker():
+    """Face-processing worker loop: claim leased batches until stopped"""
+    logger.info(f"Worker {PROCESS_ID} starting (batch {WORKER_BATCH_SIZE}, lease {WORKER_LEASE_SECONDS}s)")
+    # Progress events must reach the API processes' SSE subscribers
+    broadcaster.shared = True
+    await create_indexes()
+    if WORKER_METRICS_PORT:
+        start_http_server(WORKER_METRICS_PORT)
+    # Without models every claimed photo would be stored as faceless
+    if not await asyncio.to_thread(face_models.load):
+        raise RuntimeError(f"Face models unavailable: {face_models.error}")
+    
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    
+    wake = asyncio.Event()
+    watcher = asyncio.create_task(watch_for_new_images(wake))
+    try:
+        while not stop.is_set():
+            wake.clear()
+            await refresh_pending_images()
+            claimed = await claim_images(PROCESS_ID, WORKER_BATCH_SIZE)
+            if claimed:
+                await process_claimed_images(PROCESS_ID, claimed)
+                continue
+            # New photos first; re-encoding stored faces runs when there are none
+            job = await claim_reencode_job(PROCESS_ID)
+            if job:
+                await run_reencode_job(job)
+                continue
+            # Idle: wait for a change-stream wakeup, a stop request or the poll interval
+            waiters = [asyncio.create_task(wake.wait()), asyncio.create_task(stop.wait())]
+            await asyncio.wait(waiters, timeout=WORKER_POLL_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        logger.info(f"Worker {PROCESS_ID} stopped")
+
+async def pipeline_events_capped() -> bool:
+    try:
+        return bool((await db.pipeline_events.options()).get('capped'))
+    except Exception:
+        return False
+
+async def ensure_pipeline_events_collection():
+    """Make ``pipeline_events`` a capped collection.
+
+    Capped collections keep insertion order assigned by the server, so the
+    relay can tail them without comparing clocks of the processes that wrote
+    the events. A pre-existing uncapped collection only holds transient
+    progress events and is replaced.
+    """
+    try:
+        if 'pipeline_events' in await db.list_collection_names():
+            if await pipeline_events_capped():
+                return
+            await db.pipeline_events.drop()
+        await db.create_collection('pipeline_events', capped=True, size=PIPELINE_EVENTS_CAP_BYTES)
+    except Exception as e:
+        logger.warning(f"Could not create capped pipeline_events collection: {e}")
+
+async def relay_pipeline_events():
+    """Deliver events stored by workers (and other API replicas) to local SSE subscribers.
+
+    Tails the capped ``pipeline_events`` collection in natural (insertion)
+    order. When the cursor dies it is reopened and everything up to the last
+    delivered ``_id`` is skipped; if that event has already been evicted,
+    subscribers are told to resync.
+    """
+    last_id = None
+    cursor_type = None
+    while True:
+        try:
+            if cursor_type is None:
+                # Without a capped collection (e.g. mongomock) fall back to re-reading it
+                capped = await pipeline_events_capped()
+                cursor_type = CursorType.TAILABLE_AWAIT if capped else CursorType.NON_TAILABLE
+            if last_id is None:
+                # Start from the newest stored event; older ones predate this process
+                newest = await db.pipeline_events.find_one({}, sort=[('$natural', -1)])
+                last_id = newest['_id'] if newest else False
+            cursor = db.pipeline_events.find({}, cursor_type=cursor_type)
+            catching_up = bool(last_id)
+            while cursor.alive:
+                async for doc in cursor:
+                    if catching_up:
+                        catching_up = doc['_id'] != last_id
+                        continue
+                    last_id = doc['_id']
+                    broadcaster.deliver(doc['topic'], doc['event'])
+                if catching_up:
+                    # A full pass without meeting last_id: it was evicted, events were missed
+                    catching_up = False
+                    for topic in list(broadcaster._subscribers):
+                        broadcaster.deliver(topic, {"type": "resync"})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Pipeline event relay error: {e}")
+        await asyncio.sleep(PIPELINE_EVENTS_POLL_SECONDS)
+
+class HotFolderIngestor:
+    """Watch a directory and feed new photos straight into face processing.
+
+    Files are registered in place (no copy) when this process does the face
+    processing; in worker mode they are copied into storage, since workers may
+    not see the folder. Change notifications come from
+    watchfiles (inotify where available, polling when forced or when watchfiles
+    is missing); a file is only registered once its size and mtime have stopped
+    changing for ``settle_seconds``, so partially written files are skipped.
+
+    Every registered file is recorded in ``hot_folder_files`` (path, size,
+    mtime). Deleting or purging the image leaves that record, so a photo the
+    admin removed is not registered again by the next scan; a file that is
+    overwritten with new content is.
+    """
+
+    def __init__(self, folder: Path, event_id: str, settle_seconds: float = HOT_FOLDER_SETTLE_SECONDS,
+                 force_polling: bool = HOT_FOLDER_POLLING):
+        self.folder = folder
+        self.event_id = event_id
+        self.settle_seconds = settle_seconds
+        self.force_polling = force_polling
+        # path -> (size, mtime, monotonic time the pair was first seen)
+        self._pending: dict = {}
+        # path -> (size, mtime) already recorded in hot_folder_files
+        self._seen: dict = {}
+        self._stop = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    @staticmethod
+    def is_candidate(path: Path) -> bool:
+        # Skip hidden and temporary files written by capture software
+        return path.suffix.lower() in IMAGE_EXTENSIONS and not path.name.startswith(('.', '~'))
+
+    def note(self, path: str):
+        """Mark a path as changed; it is (re)checked until it settles"""
+        if self.is_candidate(Path(path)):
+            self._pending[path] = None
+
+    def scan(self):
+        for path in self.folder.rglob('*'):
+            if path.is_file():
+                key = str(path)
+                if key in self._pending:
+                    continue
+                if key in self._seen:
+                    try:
+                        st = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    if self._seen[key] == (st.st_size, st.st_mtime):
+                        continue
+                self.note(key)
+
+    async def run(self):
+        logger.info(f"Watching hot folder {self.folder} for event {self.event_id}")
+        self.folder.mkdir(parents=True, exist_ok=True)
+        # Pick up files dropped while the server was down
+        self.scan()
+        watcher = asyncio.create_task(self._watch())
+        try:
+            while not self._stop.is_set():
+                try:
+                    await self._flush_settled()
+                except Exception as e:
+                    logger.error(f"Hot folder ingestion error: {e}")
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=max(0.2, self.settle_seconds / 2))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+
+    async def _watch(self):
+        try:
+            from watchfiles import awatch, Change
+        except Exception as ie:
+            logger.warning(f"watchfiles not available ({ie}), polling hot folder")
+            while not self._stop.is_set():
+                self.scan()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), timeout=self.settle_seconds)
+                except asyncio.TimeoutError:
+                    pass
+            return
+        
+        async for changes in awatch(self.folder, stop_event=self._stop, force_polling=self.force_polling,
+                                    recursive=True):
+            for change, path in changes:
+                if change == Change.deleted:
+                    self._pending.pop(path, None)
+                else:
+                    self.note(path)
+
+    async def _flush_settled(self):
+        now = time.monotonic()
+        ready = []
+        for path, seen in list(self._pending.items()):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                self._pending.pop(path, None)
+                continue
+            signature = (st.st_size, st.st_mtime)
+            if seen is None or seen[:2] != signature:
+                self._pending[path] = (*signature, now)
+            elif st.st_size > 0 and now - seen[2] >= self.settle_seconds:
+                ready.append((path, signature))
+        
+        if not ready:
+            return
+        for path, _ in ready:
+            self._pending.pop(path, None)
+        
+        # Skip files registered before (even if their image has since been deleted)
+        signatures = dict(ready)
+        known = {}
+        async for record in db.hot_folder_files.find({"path": {"$in": list(signatures)}},
+                                                     {"_id": 0, "path": 1, "size": 1, "mtime": 1}):
+            known[record['path']] = (record['size'], record['mtime'])
+        # Images registered before hot_folder_files existed
+        unrecorded = [path for path in signatures if path not in known]
+        async for image in db.images.find({"original_path": {"$in": unrecorded}}, {"_id": 0, "original_path": 1}):
+            path = image['original_path']
+            known[path] = signatures[path]
+            await self._record(path, signatures[path])
+        self._seen.update(known)
+        ready = [(path, signature) for path, signature in ready if known.get(path) != signature]
+        if not ready:
+            return
+        
+        if self.event_id != DEFAULT_EVENT_ID and not await db.events.find_one({"id": self.event_id}, {"_id": 1}):
+            logger.warning(f"Hot folder event {self.event_id} does not exist; not registering {len(ready)} files")
+            return
+        
+        docs = []
+        for path, signature in ready:
+            image_id = str(uuid.uuid4())
+            image_data = {
+                "id": image_id,
+                "event_id": self.event_id,
+                # Subfolders (one per camera) often reuse names like IMG_0001.JPG;
+                # galleries are keyed by filename, so make it unique
+                "filename": f"{image_id}-{Path(path).name}",
+                "original_path": path,
+                "source": "hot_folder",
+                "upload_date": datetime.now(timezone.utc).isoformat(),
+                "processed": False,
+                "user_matches": []
+            }
+            if PROCESSING_MODE == 'worker':
+                # Workers may run on other hosts and cannot see this folder
+                key = get_original_key(self.event_id, image_data['filename'])
+                try:
+                    await asyncio.to_thread(storage.put_file, path, key)
+                except FileNotFoundError:
+                    continue
+                image_data["storage_key"] = key
+            else:
+                # We process these ourselves; hold the lease from the start
+                image_data.update({"lease_owner": PROCESS_ID, "lease_until": lease_expiry()})
+            await db.images.insert_one(image_data)
+            image_data.pop('_id', None)
+            await self._record(path, signature, image_data['id'])
+            IMAGES_INGESTED.inc()
+            broadcaster.publish_admin(self.event_id, {"type": "image_uploaded", "image": image_data})
+            docs.append(image_data)
+        
+        if docs:
+            logger.info(f"Ingested {len(docs)} images from hot folder")
+            if PROCESSING_MODE != 'worker':
+                # Straight into the pipeline; don't hold up the next flush
+                spawn(self._process(docs))
+
+    async def _record(self, path: str, signature: tuple, image_id: Optional[str] = None):
+        self._seen[path] = signature
+        await db.hot_folder_files.update_one(
+            {"path": path},
+            {"$set": {"size": signature[0], "mtime": signature[1], "event_id": self.event_id,
+                      "image_id": image_id, "recorded_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+    async def _process(self, docs: List[dict]):
+        try:
+            await process_claimed_images(PROCESS_ID, docs)
+        except Exception as e:
+            logger.error(f"Hot folder processing error: {e}")
+
+hot_folder_ingestor: Optional[HotFolderIngestor] = None
+
 # Routes
 @api_router.get("/")
 async def root():
     return {"message": "Event Photo Face Recognition API"}
 
+@api_router.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once the face models are warm and Mongo answers"""
+    status = {
+        "models": face_models.state,
+        "models_load_seconds": face_models.load_seconds,
+        "database": "ok"
+    }
+    try:
+        await db.command("ping")
+    except Exception as e:
+        status["database"] = str(e)
+    ready = face_models.ready and status["database"] == "ok"
+    status["ready"] = ready
+    return JSONResponse(status, status_code=200 if ready else 503)
+
 @api_router.post("/register")
 async def register_user(registration: UserRegistration):
     """Register a new user with face encoding"""
     try:
-        # Check if email already exists
-        existing = await db.users.find_one({"email": registration.email})
+        event_id = resolve_event_id(registration.event_id)
+        await ensure_event_exists(event_id)
+        
+        # Check if email already exists for this event
+        existing = await db.users.find_one({"email": registration.email, **event_query(event_id)})
         if existing:
             raise HTTPException(status_code=400, detail="Email already registered")
         
-        # Extract face encoding
-        face_encoding = encode_face_from_base64(registration.face_image_data)
+        # Extract face encodings off the event loop; extra selfies without a face are skipped
+        loop = asyncio.get_running_loop()
+        selfies = [registration.face_image_data] + registration.additional_face_images[:MAX_REFERENCE_ENCODINGS - 1]
+        encodings = await loop.run_in_executor(processing_executor, encode_selfies, selfies)
+        face_encoding = encodings[0]
         
         if not face_encoding:
             raise HTTPException(status_code=400, detail="No face detected in image. Please try again with a clear face photo.")
         
+        references = [np.asarray(e, dtype=ENCODING_DTYPE) for e in encodings if e]
+        
         # Create user
         user_data = {
             "id": str(uuid.uuid4()),
@@ -285,20 +1549,21 @@ async def register_user(registration: UserRegistration):
             "email": registration.email,
             "phone": registration.phone,
             "gallery_id": str(uuid.uuid4())[:8],
-            "face_encoding": face_encoding,
+            "event_id": event_id,
+            **face_template_fields(references),
             "created_at": datetime.now(timezone.utc).isoformat()
         }
         
-        # Create user gallery directory
-        user_gallery_dir = USERS_DIR / user_data['gallery_id']
-        user_gallery_dir.mkdir(exist_ok=True)
-        
         await db.users.insert_one(user_data)
+        await invalidate_event_encoding_index(event_id)
+        USERS_REGISTERED.inc()
         
         return {
             "success": True,
             "gallery_id": user_data['gallery_id'],
-            "name": user_data['name']
+            "event_id": event_id,
+            "name": user_data['name'],
+            "reference_count": len(references)
         }
     
     except HTTPException:
@@ -307,6 +1572,37 @@ async def register_user(registration: UserRegistration):
         logger.error(f"Registration error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/gallery/{gallery_id}/faces")
+async def enroll_face(gallery_id: str, enrollment: FaceEnrollment):
+    """Add another selfie to a user's reference encodings"""
+    try:
+        user = await db.users.find_one({"gallery_id": gallery_id})
+        
+        if not user:
+            raise HTTPException(status_code=404, detail="Gallery not found")
+        
+        loop = asyncio.get_running_loop()
+        face_encoding = await loop.run_in_executor(
+            processing_executor, encode_face_from_base64, enrollment.face_image_data
+        )
+        
+        if not face_encoding:
+            raise HTTPException(status_code=400, detail="No face detected in image. Please try again with a clear face photo.")
+        
+        reference_count = await add_reference_encoding(user['id'], face_encoding)
+        
+        return {
+            "success": True,
+            "gallery_id": gallery_id,
+            "reference_count": reference_count
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Face enrollment error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/gallery/{gallery_id}")
 async def get_gallery(gallery_id: str):
     """Get all images for a user's gallery"""
@@ -316,22 +1612,29 @@ async def get_gallery(gallery_id: str):
         if not user:
             raise HTTPException(status_code=404, detail="Gallery not found")
         
-        gallery_dir = USERS_DIR / gallery_id
+        gallery_prefix = get_gallery_key(resolve_event_id(user.get('event_id')), gallery_id)
+        filenames = await asyncio.to_thread(storage.list, gallery_prefix)
         
-        if not gallery_dir.exists():
-            return {
-                "gallery_id": gallery_id,
-                "user_name": user['name'],
-                "images": []
-            }
+        # Order by capture time (EXIF), falling back to upload time
+        taken = {}
+        async for image in db.images.find(
+            {"user_matches": user['id']},
+            {"_id": 0, "filename": 1, "captured_at": 1, "upload_date": 1}
+        ):
+            taken[image['filename']] = (image.get('captured_at'), image.get('upload_date') or '')
+        
+        def sort_key(name: str):
+            captured_at, upload_date = taken.get(name, (None, ''))
+            return (name not in taken, captured_at or upload_date, name)
+        filenames.sort(key=sort_key)
         
         images = []
-        for img_file in gallery_dir.glob('*'):
-            if img_file.is_file():
-                images.append({
-                    "filename": img_file.name,
-                    "url": f"/api/image/{gallery_id}/{img_file.name}"
-                })
+        for filename in filenames:
+            images.append({
+                "filename": filename,
+                "captured_at": taken.get(filename, (None, None))[0],
+                "url": f"/api/image/{gallery_id}/{filename}"
+            })
         
         return {
             "gallery_id": gallery_id,
@@ -346,18 +1649,39 @@ async def get_gallery(gallery_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/image/{gallery_id}/{filename}")
-async def get_image(gallery_id: str, filename: str):
+async def get_image(gallery_id: str, filename: str, event_id: Optional[str] = None):
     """Serve an image from a user's gallery"""
-    # Special case for admin to view original images
-    if gallery_id == "admin":
-        image_path = ORIGINAL_DIR / filename
-    else:
-        image_path = USERS_DIR / gallery_id / filename
+    try:
+        # Special case for admin to view original images, addressed by image id
+        # (/api/image/admin/<image_id>); filenames are only unique within an event
+        if gallery_id == "admin":
+            projection = {"_id": 0, "original_path": 1, "storage_key": 1}
+            image = await db.images.find_one({"id": filename}, projection)
+            if image is None:
+                # Older links: /api/image/admin/<filename>?event_id=...
+                event_id = resolve_event_id(event_id)
+                image = await db.images.find_one({"filename": filename, **event_query(event_id)}, projection)
+            if image and not image.get('storage_key'):
+                # Hot-folder images are registered in place, outside storage
+                image_path = Path(image['original_path'])
+                response = FileResponse(image_path) if image_path.is_file() else None
+            else:
+                key = image['storage_key'] if image else get_original_key(event_id, filename)
+                response = await asyncio.to_thread(storage.response, key)
+        else:
+            user = await db.users.find_one({"gallery_id": gallery_id}, {"_id": 0, "event_id": 1})
+            if not user:
+                raise HTTPException(status_code=404, detail="Image not found")
+            key = get_gallery_key(resolve_event_id(user.get('event_id')), gallery_id, filename)
+            response = await asyncio.to_thread(storage.response, key)
+    except ValueError:
+        # Storage keys built from path segments like '..'
+        raise HTTPException(status_code=404, detail="Image not found")
     
-    if not image_path.exists():
+    if response is None:
         raise HTTPException(status_code=404, detail="Image not found")
     
-    return FileResponse(image_path)
+    return response
 
 @api_router.get("/qrcode/{gallery_id}")
 async def generate_qr_code(gallery_id: str):
@@ -367,6 +1691,7 @@ async def generate_qr_code(gallery_id: str):
         gallery_url = f"{getenv_strip('FRONTEND_URL', 'https://localhost:3000')}/gallery/{gallery_id}"
         
         # Create QR code
+        import qrcode
         qr = qrcode.QRCode(
             version=1,
             error_correction=qrcode.constants.ERROR_CORRECT_L,
@@ -389,7 +1714,77 @@ async def generate_qr_code(gallery_id: str):
         logger.error(f"QR code generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Realtime progress (Server-Sent Events)
+async def sse_stream(topic: str):
+    """Yield SSE messages for a topic until the client disconnects"""
+    queue = broadcaster.subscribe(topic)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    finally:
+        broadcaster.unsubscribe(topic, queue)
+
+def sse_response(topic: str) -> StreamingResponse:
+    return StreamingResponse(
+        sse_stream(topic),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.get("/stream/gallery/{gallery_id}")
+async def stream_gallery(gallery_id: str):
+    """Push a notification whenever a new photo is matched to this gallery"""
+    user = await db.users.find_one({"gallery_id": gallery_id}, {"_id": 1})
+    if not user:
+        raise HTTPException(status_code=404, detail="Gallery not found")
+    return sse_response(f"gallery:{gallery_id}")
+
+@api_router.get("/stream/admin")
+async def stream_admin(event_id: Optional[str] = None):
+    """Push upload and per-image processing events to the admin dashboard"""
+    topic = f"admin:{resolve_event_id(event_id)}" if event_id else "admin"
+    return sse_response(topic)
+
 # Admin Routes
+@api_router.post("/admin/events")
+async def create_event(event: EventCreate):
+    """Create an event that users and images can be partitioned into"""
+    try:
+        event_id = resolve_event_id(event.event_id or str(uuid.uuid4())[:8])
+        if event_id == DEFAULT_EVENT_ID or await db.events.find_one({"id": event_id}):
+            raise HTTPException(status_code=400, detail="Event already exists")
+        
+        event_data = Event(
+            id=event_id,
+            name=event.name,
+            created_at=datetime.now(timezone.utc).isoformat()
+        ).model_dump()
+        
+        await db.events.insert_one(dict(event_data))
+        
+        return {"success": True, "event": event_data}
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Create event error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/admin/events", response_model=List[dict])
+async def get_all_events():
+    """Get all events (limited to 1000 for performance)"""
+    try:
+        events = await db.events.find({}, {"_id": 0}).limit(1000).to_list(1000)
+        return events
+    except Exception as e:
+        logger.error(f"Fetch events error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.post("/admin/login")
 async def admin_login(login: AdminLogin):
     """Admin login"""
@@ -399,7 +1794,7 @@ async def admin_login(login: AdminLogin):
         if not admin:
             # Create default admin if none exists
             if login.email == "admin@event.com" and login.password == "admin123":
-                hashed = pwd_context.hash(login.password)
+                hashed = get_pwd_context().hash(login.password)
                 await db.admin_users.insert_one({
                     "email": login.email,
                     "password_hash": hashed
@@ -407,7 +1802,7 @@ async def admin_login(login: AdminLogin):
                 return {"success": True, "token": "admin_token"}
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
-        if not pwd_context.verify(login.password, admin['password_hash']):
+        if not get_pwd_context().verify(login.password, admin['password_hash']):
             raise HTTPException(status_code=401, detail="Invalid credentials")
         
         return {"success": True, "token": "admin_token"}
@@ -419,24 +1814,25 @@ async def admin_login(login: AdminLogin):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/admin/upload")
-async def upload_images(files: List[UploadFile] = File(...)):
+async def upload_images(files: List[UploadFile] = File(...), event_id: Optional[str] = Form(None)):
     """Upload multiple event photos"""
     try:
+        event_id = resolve_event_id(event_id)
+        await ensure_event_exists(event_id)
         uploaded_files = []
         
         for file in files:
-            # Save to original directory
-            file_path = ORIGINAL_DIR / file.filename
-            
-            with open(file_path, "wb") as f:
-                content = await file.read()
-                f.write(content)
+            # Stream to the event's originals in storage (multipart for large files on S3)
+            key = get_original_key(event_id, file.filename)
+            await asyncio.to_thread(storage.save, key, file.file)
             
             # Create metadata
             image_data = {
                 "id": str(uuid.uuid4()),
+                "event_id": event_id,
                 "filename": file.filename,
-                "original_path": str(file_path),
+                "storage_key": key,
+                "original_path": storage.uri(key),
                 "upload_date": datetime.now(timezone.utc).isoformat(),
                 "processed": False,
                 "user_matches": []
@@ -444,46 +1840,72 @@ async def upload_images(files: List[UploadFile] = File(...)):
             
             await db.images.insert_one(image_data)
             uploaded_files.append(file.filename)
+            IMAGES_UPLOADED.inc()
+            image_data.pop('_id', None)
+            broadcaster.publish_admin(event_id, {"type": "image_uploaded", "image": image_data})
             
             logger.info(f"Uploaded {file.filename}")
         
         return {
             "success": True,
+            "event_id": event_id,
             "uploaded_count": len(uploaded_files),
             "files": uploaded_files
         }
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/admin/process")
-async def trigger_processing(background_tasks: BackgroundTasks):
-    """Trigger face recognition processing"""
-    background_tasks.add_task(process_images_background)
+async def trigger_processing(background_tasks: BackgroundTasks, event_id: Optional[str] = None):
+    """Trigger face recognition processing, optionally for a single event"""
+    if PROCESSING_MODE == 'worker':
+        # Workers claim unprocessed images on their own; nothing to wait for here
+        return {
+            "success": True,
+            "queued": True,
+            "message": "Images are queued for the processing workers"
+        }
+    background_tasks.add_task(process_images_background, event_id)
     return {
         "success": True,
         "message": "Processing started in background"
     }
 
+@api_router.post("/admin/migrate/encodings")
+async def migrate_encodings():
+    """Convert legacy array face encodings to packed float32 blobs"""
+    try:
+        migrated = await migrate_face_encodings()
+        logger.info(f"Migrated {migrated} face encodings")
+        return {"success": True, "migrated": migrated}
+    except Exception as e:
+        logger.error(f"Encoding migration error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.get("/admin/users", response_model=List[dict])
-async def get_all_users():
+async def get_all_users(event_id: Optional[str] = None):
     """Get all registered users (limited to 1000 for performance)"""
     try:
-        users = await db.users.find({}, {"_id": 0, "face_encoding": 0}).limit(1000).to_list(1000)
+        query = event_query(resolve_event_id(event_id)) if event_id else {}
+        users = await db.users.find(query, {"_id": 0, "face_encoding": 0, "reference_encodings": 0}).limit(1000).to_list(1000)
         return users
     except Exception as e:
         logger.error(f"Fetch users error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/admin/stats", response_model=DashboardStats)
-async def get_dashboard_stats():
+async def get_dashboard_stats(event_id: Optional[str] = None):
     """Get dashboard statistics"""
     try:
-        total_users = await db.users.count_documents({})
-        total_images = await db.images.count_documents({})
-        processed_images = await db.images.count_documents({"processed": True})
-        pending_images = await db.images.count_documents({"processed": False})
+        query = event_query(resolve_event_id(event_id)) if event_id else {}
+        total_users = await db.users.count_documents(query)
+        total_images = await db.images.count_documents(query)
+        processed_images = await db.images.count_documents({"processed": True, **query})
+        pending_images = await db.images.count_documents({"processed": False, **query})
         
         return DashboardStats(
             total_users=total_users,
@@ -496,43 +1918,309 @@ async def get_dashboard_stats():
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.get("/admin/images")
-async def get_all_images():
+async def get_all_images(event_id: Optional[str] = None):
     """Get all uploaded images with metadata (limited to 500 for performance)"""
     try:
-        images = await db.images.find({}, {"_id": 0}).limit(500).to_list(500)
+        query = event_query(resolve_event_id(event_id)) if event_id else {}
+        images = await db.images.find(query, {"_id": 0, "faces.encoding": 0}).limit(500).to_list(500)
         return images
     except Exception as e:
         logger.error(f"Fetch images error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/admin/faces")
+async def get_face_crops(event_id: Optional[str] = None, image_id: Optional[str] = None, limit: int = 100):
+    """List cached face crops, newest images first, with the user each face was assigned to"""
+    try:
+        query = {"faces.0": {"$exists": True}}
+        if event_id:
+            query.update(event_query(resolve_event_id(event_id)))
+        if image_id:
+            query["id"] = image_id
+        limit = max(1, min(limit, 500))
+        images = await db.images.find(
+            query,
+            {"_id": 0, "id": 1, "filename": 1, "event_id": 1, "faces.box": 1, "matches": 1}
+        ).sort("upload_date", -1).limit(limit).to_list(limit)
+        
+        faces = []
+        for image in images:
+            assigned = {m['face_index']: m for m in image.get('matches', [])}
+            for index, face in enumerate(image.get('faces', [])):
+                match = assigned.get(index)
+                faces.append({
+                    "image_id": image['id'],
+                    "filename": image['filename'],
+                    "event_id": resolve_event_id(image.get('event_id')),
+                    "face_index": index,
+                    "box": face.get('box'),
+                    "user_id": match['user_id'] if match else None,
+                    "distance": match['distance'] if match else None,
+                    "url": f"/api/admin/faces/{image['id']}/{index}"
+                })
+        return faces
+    except Exception as e:
+        logger.error(f"Fetch face crops error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/admin/faces/{image_id}/{face_index}")
+async def get_face_crop(image_id: str, face_index: int):
+    """Serve one cached face crop"""
+    image = await db.images.find_one({"id": image_id}, {"_id": 1})
+    if not image:
+        raise HTTPException(status_code=404, detail="Face not found")
+    response = await asyncio.to_thread(storage.response, get_face_crop_key(image_id, face_index))
+    if response is None:
+        raise HTTPException(status_code=404, detail="Face not found")
+    return response
+
+async def run_reencode_job(job: dict):
+    """Recompute stored image face encodings from cached crops instead of the originals.
+
+    Only for changing ``num_jitters`` within ENCODING_MODEL: user reference
+    encodings are not recomputed (no selfie crops are kept) and existing
+    matches are not re-run, so a different model would leave image and user
+    encodings incomparable. A model change means reprocessing and having
+    guests register again.
+    """
+    job_id, num_jitters = job['id'], job['request']['num_jitters']
+    try:
+        query = {"faces.0": {"$exists": True}}
+        if job['request'].get('event_id'):
+            query.update(event_query(resolve_event_id(job['request']['event_id'])))
+        loop = asyncio.get_running_loop()
+        updated = skipped = 0
+        async for image in db.images.find(query, {"_id": 0, "id": 1, "faces": 1}):
+            chip_keys = [get_face_crop_key(image['id'], i) for i in range(len(image['faces']))]
+            encodings = await loop.run_in_executor(processing_executor, encode_face_chips, chip_keys, num_jitters)
+            if any(e is None for e in encodings):
+                skipped += 1
+                continue
+            faces = [{**face, "encoding": pack_encoding(enc)} for face, enc in zip(image['faces'], encodings)]
+            await db.images.update_one({"id": image['id']}, {"$set": {"faces": faces, "encoding_jitters": num_jitters}})
+            updated += 1
+        logger.info(f"Re-encoded faces of {updated} images from crops ({skipped} skipped: crops missing or unreadable)")
+        update = {"status": "completed", "done": updated, "skipped": skipped}
+    except Exception as e:
+        logger.error(f"Error re-encoding faces: {e}")
+        update = {"status": "failed", "error": str(e)}
+    job = await db.jobs.find_one_and_update(
+        {"id": job_id},
+        {"$set": {**update, "finished_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    broadcaster.publish('admin', {"type": "job_progress", "job": job})
+
+async def claim_reencode_job(owner: str) -> Optional[dict]:
+    """Take the oldest queued re-encode job (worker mode)"""
+    return await db.jobs.find_one_and_update(
+        {"type": "reencode", "status": "queued"},
+        {"$set": {"status": "running", "owner": owner}},
+        sort=[("created_at", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+@api_router.post("/admin/faces/reencode")
+async def trigger_reencode(background_tasks: BackgroundTasks, event_id: Optional[str] = None, num_jitters: int = 1):
+    """Re-encode stored image faces from their crops with another ``num_jitters`` (same model only)"""
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": "reencode",
+        "status": "queued",
+        "request": {"event_id": event_id, "num_jitters": max(1, num_jitters)},
+        "done": 0,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    if PROCESSING_MODE == 'worker':
+        # CPU-heavy: a processing worker picks the job up, not the API
+        await db.jobs.insert_one(job)
+        return {"success": True, "job_id": job['id'], "message": "Re-encoding queued for the processing workers"}
+    job.update({"status": "running", "owner": PROCESS_ID})
+    await db.jobs.insert_one(job)
+    background_tasks.add_task(run_reencode_job, job)
+    return {"success": True, "job_id": job['id'], "message": "Re-encoding started in background"}
+
+# Deletion. Images and users are deleted in batches: one $in query for the
+# affected documents and file removal spread over delete_executor.
+def remove_local_paths(paths: List[Path]):
+    for path in paths:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+
+async def run_deletions(keys: List[str], prefixes: List[str] = (), paths: List[Path] = ()):
+    """Delete storage keys, storage prefixes and local paths in parallel"""
+    loop = asyncio.get_running_loop()
+    chunk = max(1, -(-len(keys) // DELETE_WORKERS))
+    tasks = [loop.run_in_executor(delete_executor, storage.delete_many, keys[i:i + chunk])
+             for i in range(0, len(keys), chunk)]
+    tasks += [loop.run_in_executor(delete_executor, storage.delete_prefix, prefix) for prefix in prefixes]
+    if paths:
+        tasks.append(loop.run_in_executor(delete_executor, remove_local_paths, list(paths)))
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    for error in errors:
+        logger.error(f"File deletion error: {error}")
+    return len(errors)
+
+async def delete_images_batch(images: List[dict]) -> int:
+    """Delete images with their originals, gallery copies and face crops; returns file errors"""
+    if not images:
+        return 0
+    matched_ids = list({uid for image in images for uid in image.get('user_matches', [])})
+    galleries = {}
+    if matched_ids:
+        async for user in db.users.find({"id": {"$in": matched_ids}}, {"_id": 0, "id": 1, "gallery_id": 1}):
+            galleries[user['id']] = user['gallery_id']
+    
+    keys, prefixes, paths = [], [], []
+    for image in images:
+        if image.get('storage_key'):
+            keys.append(image['storage_key'])
+        elif image.get('original_path') and image.get('source') != 'hot_folder':
+            # Hot-folder paths are the photographer's own files, not ours to delete
+            paths.append(Path(image['original_path']))
+        event_id = resolve_event_id(image.get('event_id'))
+        keys += [get_gallery_key(event_id, galleries[uid], image['filename'])
+                 for uid in image.get('user_matches', []) if uid in galleries]
+        prefixes.append(get_face_crop_prefix(image['id']))
+    errors = await run_deletions(keys, prefixes=prefixes, paths=paths)
+    
+    await db.images.delete_many({"id": {"$in": [image['id'] for image in images]}})
+    return errors
+
+async def delete_users_batch(users: List[dict]) -> int:
+    """Delete users with their galleries and remove them from image matches; returns file errors"""
+    if not users:
+        return 0
+    user_ids = [user['id'] for user in users]
+    errors = await run_deletions(
+        [], prefixes=[get_gallery_key(resolve_event_id(u.get('event_id')), u['gallery_id']) for u in users]
+    )
+    await db.users.delete_many({"id": {"$in": user_ids}})
+    await db.images.update_many(
+        {"user_matches": {"$in": user_ids}},
+        {"$pull": {"user_matches": {"$in": user_ids}, "matches": {"user_id": {"$in": user_ids}}}}
+    )
+    for event_id in {resolve_event_id(u.get('event_id')) for u in users}:
+        await invalidate_event_encoding_index(event_id)
+    return errors
+
+IMAGE_DELETE_FIELDS = {"_id": 0, "id": 1, "event_id": 1, "filename": 1, "storage_key": 1,
+                       "original_path": 1, "source": 1, "user_matches": 1}
+USER_DELETE_FIELDS = {"_id": 0, "id": 1, "event_id": 1, "gallery_id": 1}
+
+async def purge_in_batches(collection, query: dict, fields: dict, delete_batch, progress):
+    """Delete every document matching ``query``, DELETE_BATCH_SIZE at a time"""
+    while True:
+        # Deleted documents drop out of the query, so always take the first batch
+        batch = await collection.find(query, fields).limit(DELETE_BATCH_SIZE).to_list(DELETE_BATCH_SIZE)
+        if not batch:
+            return
+        errors = await delete_batch(batch)
+        await progress(len(batch), errors)
+        if len(batch) < DELETE_BATCH_SIZE:
+            return
+
+async def run_purge_job(job_id: str, request: PurgeRequest):
+    """Background purge of images, users or a whole event, recording progress on the job"""
+    async def progress(count: int, errors: int):
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id},
+            {"$inc": {"done": count, "file_errors": errors}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        broadcaster.publish('admin', {"type": "job_progress", "job": job})
+    
+    try:
+        await db.jobs.update_one({"id": job_id}, {"$set": {"status": "running"}})
+        if request.image_ids:
+            await purge_in_batches(db.images, {"id": {"$in": request.image_ids}},
+                                   IMAGE_DELETE_FIELDS, delete_images_batch, progress)
+        if request.user_ids:
+            await purge_in_batches(db.users, {"id": {"$in": request.user_ids}},
+                                   USER_DELETE_FIELDS, delete_users_batch, progress)
+        if request.event_id:
+            event_id = resolve_event_id(request.event_id)
+            query = event_query(event_id)
+            await purge_in_batches(db.images, query, IMAGE_DELETE_FIELDS, delete_images_batch, progress)
+            await purge_in_batches(db.users, query, USER_DELETE_FIELDS, delete_users_batch, progress)
+            if event_id != DEFAULT_EVENT_ID:
+                # Anything left under the event's own prefix (e.g. unregistered files)
+                await run_deletions([], prefixes=[f'events/{event_id}'])
+                await db.events.delete_one({"id": event_id})
+            # Bump rather than delete the version: a restarted counter could match a stale cached index
+            await invalidate_event_encoding_index(event_id)
+        
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id},
+            {"$set": {"status": "completed", "finished_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        logger.info(f"Purge job {job_id} deleted {job['done']} documents")
+    except Exception as e:
+        logger.error(f"Purge job {job_id} failed: {e}")
+        job = await db.jobs.find_one_and_update(
+            {"id": job_id},
+            {"$set": {"status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    broadcaster.publish('admin', {"type": "job_progress", "job": job})
+
+@api_router.post("/admin/purge")
+async def purge(request: PurgeRequest, background_tasks: BackgroundTasks):
+    """Delete many images, many users or a whole event as a background job"""
+    try:
+        if not (request.image_ids or request.user_ids or request.event_id):
+            raise HTTPException(status_code=400, detail="Nothing to purge")
+        
+        total = len(request.image_ids) + len(request.user_ids)
+        if request.event_id:
+            query = event_query(resolve_event_id(request.event_id))
+            total += await db.images.count_documents(query) + await db.users.count_documents(query)
+        
+        job = {
+            "id": str(uuid.uuid4()),
+            "type": "purge",
+            "status": "queued",
+            "request": request.model_dump(),
+            "total": total,
+            "done": 0,
+            "file_errors": 0,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+        await db.jobs.insert_one(job)
+        background_tasks.add_task(run_purge_job, job['id'], request)
+        return {"success": True, "job_id": job['id'], "total": total}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Purge error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/admin/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Progress of a background job"""
+    job = await db.jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 @api_router.delete("/admin/user/{user_id}")
 async def delete_user(user_id: str):
     """Delete a registered user and their gallery"""
     try:
-        # Find user first
-        user = await db.users.find_one({"id": user_id})
+        user = await db.users.find_one({"id": user_id}, {**USER_DELETE_FIELDS, "name": 1})
         
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         
-        # Delete user's gallery folder
-        user_gallery_dir = USERS_DIR / user['gallery_id']
-        if user_gallery_dir.exists():
-            shutil.rmtree(user_gallery_dir)
-            logger.info(f"Deleted gallery folder for user {user['name']}")
-        
-        # Remove user from database
-        result = await db.users.delete_one({"id": user_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Update images to remove this user from matches
-        await db.images.update_many(
-            {"user_matches": user_id},
-            {"$pull": {"user_matches": user_id}}
-        )
-        
+        await delete_users_batch([user])
         logger.info(f"Deleted user: {user['name']} ({user_id})")
         
         return {
@@ -550,33 +2238,12 @@ async def delete_user(user_id: str):
 async def delete_image(image_id: str):
     """Delete an uploaded image and its matches"""
     try:
-        # Find image first
-        image = await db.images.find_one({"id": image_id})
+        image = await db.images.find_one({"id": image_id}, IMAGE_DELETE_FIELDS)
         
         if not image:
             raise HTTPException(status_code=404, detail="Image not found")
         
-        # 1. Delete original file
-        orig_path = Path(image['original_path'])
-        if orig_path.exists():
-            orig_path.unlink()
-            logger.info(f"Deleted original image at {orig_path}")
-            
-        # 2. Delete matches in user galleries
-        for user_id in image.get('user_matches', []):
-            user = await db.users.find_one({"id": user_id})
-            if user:
-                user_gallery_path = USERS_DIR / user['gallery_id'] / image['filename']
-                if user_gallery_path.exists():
-                    user_gallery_path.unlink()
-                    logger.info(f"Deleted matched image in user {user['name']}'s gallery")
-        
-        # 3. Remove from database
-        result = await db.images.delete_one({"id": image_id})
-        
-        if result.deleted_count == 0:
-            raise HTTPException(status_code=404, detail="Image not found")
-            
+        await delete_images_batch([image])
         logger.info(f"Deleted image record: {image_id}")
         
         return {
@@ -593,6 +2260,35 @@ async def delete_image(image_id: str):
 # Include the router in the main app
 app.include_router(api_router)
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics in text exposition format"""
+    await refresh_pending_images()
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record per-route latency and optionally expose it as response headers"""
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        # Label by route template rather than raw path to keep cardinality bounded
+        route = request.scope.get('route')
+        route_path = getattr(route, 'path', 'unmatched')
+        if route_path != '/metrics':
+            HTTP_REQUEST_SECONDS.labels(method=request.method, route=route_path, status=str(status)).observe(elapsed)
+    if TIMING_HEADERS:
+        response.headers['Server-Timing'] = f"app;dur={elapsed * 1000:.1f}"
+        response.headers['X-Process-Time'] = f"{elapsed:.4f}"
+    return response
+
+# Inside CORS so rejections still carry CORS headers
+app.add_middleware(AdmissionMiddleware, controller=admission, client_ip_header=CLIENT_IP_HEADER)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -619,6 +2315,62 @@ if FRONTEND_BUILD_DIR.exists():
         
         return {"error": "Frontend not built"}
 
+@app.on_event("startup")
+async def create_indexes():
+    """Index the event partitions used by matching, listing and stats"""
+    try:
+        await db.users.create_index("event_id")
+        await db.users.create_index("gallery_id")
+        await db.images.create_index([("event_id", 1), ("processed", 1)])
+        await db.images.create_index("id")
+        await db.images.create_index("original_path")
+        await db.hot_folder_files.create_index("path", unique=True)
+        await db.images.create_index([("processed", 1), ("lease_until", 1), ("upload_date", 1)])
+        await db.events.create_index("id", unique=True)
+        await db.jobs.create_index("id", unique=True)
+        await db.images.create_index("user_matches")
+    except Exception as e:
+        logger.warning(f"Could not create indexes: {e}")
+    await ensure_pipeline_events_collection()
+
+@app.on_event("startup")
+async def start_hot_folder():
+    """Start watching HOT_FOLDER when configured"""
+    global hot_folder_ingestor
+    if HOT_FOLDER:
+        hot_folder_ingestor = HotFolderIngestor(Path(HOT_FOLDER), resolve_event_id(HOT_FOLDER_EVENT_ID))
+        hot_folder_ingestor.start()
+
+@app.on_event("startup")
+async def preload_face_models():
+    """Warm the face models in the background; /api/ready reports when done"""
+    if PRELOAD_MODELS:
+        asyncio.get_running_loop().run_in_executor(processing_executor, face_models.load)
+
+pipeline_event_relay: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+async def start_pipeline_event_relay():
+    """Relay worker progress events to SSE clients when processing runs in workers"""
+    global pipeline_event_relay
+    if PROCESSING_MODE == 'worker':
+        pipeline_event_relay = asyncio.create_task(relay_pipeline_events())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if hot_folder_ingestor:
+        await hot_folder_ingestor.stop()
+    if pipeline_event_relay:
+        pipeline_event_relay.cancel()
+    client.close()
+    processing_executor.shutdown(wait=False)
+    delete_executor.shutdown(wait=False)
+
+if __name__ == "__main__":
+    # python -m server worker  -> face-processing worker
+    # python -m server         -> API server
+    if sys.argv[1:2] == ['worker']:
+        asyncio.run(run_worker())
+    else:
+        import uvicorn
+        uvicorn.run(app, host="0.0.0.0", port=int(getenv_strip('PORT') or 8000))
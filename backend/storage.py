@@ -0,0 +1,233 @@
+"""Storage backends for originals, user galleries and face crops.
+
+Objects are addressed by POSIX keys relative to the upload root, e.g.
+``original/photo.jpg``, ``users/<gallery_id>/photo.jpg`` or
+``faces/<image_id>/0.jpg``. ``LocalStorage``
+keeps the existing on-disk layout under UPLOAD_DIR; ``S3Storage`` stores the
+same keys in an S3-compatible bucket (AWS, MinIO, moto) so several app
+replicas can share them and delivery can go through presigned URLs / a CDN.
+
+All methods are blocking; call them from a thread (``asyncio.to_thread``).
+"""
+import mimetypes
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Iterator, List, Optional
+
+from fastapi.responses import FileResponse, RedirectResponse, Response
+
+
+def _check_key(key: str) -> str:
+    """Reject keys that could escape the storage root"""
+    parts = PurePosixPath(key).parts
+    if not parts or key.startswith('/') or '..' in parts:
+        raise ValueError(f"Invalid storage key: {key!r}")
+    return key
+
+
+class LocalStorage:
+    """Objects stored as files under a root directory"""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, key: str) -> Path:
+        return self.root / _check_key(key)
+
+    def uri(self, key: str) -> str:
+        return str(self.path(key))
+
+    def save(self, key: str, fileobj: BinaryIO):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(fileobj, f, length=1024 * 1024)
+
+    def put_file(self, local_path: str, key: str):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(local_path, path)
+
+    def copy(self, src_key: str, dst_key: str):
+        self.put_file(str(self.path(src_key)), dst_key)
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def delete(self, key: str) -> bool:
+        path = self.path(key)
+        if path.is_file():
+            path.unlink()
+            return True
+        return False
+
+    def delete_many(self, keys: List[str]):
+        for key in keys:
+            self.delete(key)
+
+    def delete_prefix(self, prefix: str):
+        path = self.path(prefix.rstrip('/'))
+        if path.is_dir():
+            shutil.rmtree(path)
+
+    def list(self, prefix: str) -> List[str]:
+        """Names of the files directly under a prefix"""
+        path = self.path(prefix.rstrip('/'))
+        if not path.is_dir():
+            return []
+        return [p.name for p in path.iterdir() if p.is_file()]
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        """Yield a local filesystem path holding the object"""
+        path = self.path(key)
+        if not path.is_file():
+            raise FileNotFoundError(key)
+        yield path
+
+    def response(self, key: str) -> Optional[Response]:
+        """HTTP response delivering the object, or None if it does not exist"""
+        path = self.path(key)
+        return FileResponse(path) if path.is_file() else None
+
+
+class S3Storage:
+    """Objects stored in an S3-compatible bucket.
+
+    One boto3 client (thread-safe, with a connection pool sized by
+    ``max_pool_connections``) is shared by all threads. Uploads and copies go
+    through the managed transfer API, which switches to multipart above
+    ``multipart_threshold``. Reads are served as redirects to presigned URLs so
+    image bytes never pass through the app.
+    """
+
+    def __init__(self, bucket: str, prefix: str = '', endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None, max_pool_connections: int = 50,
+                 multipart_threshold: int = 8 * 1024 * 1024, presign_expiry: int = 3600,
+                 temp_dir: Optional[Path] = None):
+        import boto3
+        from botocore.config import Config
+        from boto3.s3.transfer import TransferConfig
+
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.presign_expiry = presign_expiry
+        self.temp_dir = temp_dir
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                retries={'max_attempts': 5, 'mode': 'standard'}
+            )
+        )
+        self.transfer = TransferConfig(
+            multipart_threshold=multipart_threshold,
+            multipart_chunksize=multipart_threshold,
+            max_concurrency=min(10, max_pool_connections)
+        )
+
+    def object_key(self, key: str) -> str:
+        key = _check_key(key)
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self.object_key(key)}"
+
+    @staticmethod
+    def _is_missing(error) -> bool:
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    @staticmethod
+    def _extra_args(key: str) -> dict:
+        content_type = mimetypes.guess_type(key)[0]
+        return {'ContentType': content_type} if content_type else {}
+
+    def save(self, key: str, fileobj: BinaryIO):
+        self.client.upload_fileobj(fileobj, self.bucket, self.object_key(key),
+                                   ExtraArgs=self._extra_args(key), Config=self.transfer)
+
+    def put_file(self, local_path: str, key: str):
+        self.client.upload_file(local_path, self.bucket, self.object_key(key),
+                                ExtraArgs=self._extra_args(key), Config=self.transfer)
+
+    def copy(self, src_key: str, dst_key: str):
+        # Server-side copy: the bytes never leave the bucket
+        self.client.copy({'Bucket': self.bucket, 'Key': self.object_key(src_key)},
+                         self.bucket, self.object_key(dst_key), Config=self.transfer)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if self._is_missing(e):
+                return False
+            raise
+
+    def delete(self, key: str) -> bool:
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+        return True
+
+    def _delete_objects(self, object_keys: List[str]):
+        # DeleteObjects takes at most 1000 keys per request
+        for i in range(0, len(object_keys), 1000):
+            batch = [{'Key': k} for k in object_keys[i:i + 1000]]
+            self.client.delete_objects(Bucket=self.bucket, Delete={'Objects': batch, 'Quiet': True})
+
+    def delete_many(self, keys: List[str]):
+        self._delete_objects([self.object_key(key) for key in keys])
+
+    def _iter_keys(self, prefix: str) -> Iterator[str]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        full_prefix = self.object_key(prefix.rstrip('/')) + '/'
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(full_prefix):]
+
+    def delete_prefix(self, prefix: str):
+        full_prefix = self.object_key(prefix.rstrip('/')) + '/'
+        self._delete_objects([full_prefix + name for name in self._iter_keys(prefix)])
+
+    def list(self, prefix: str) -> List[str]:
+        """Names of the objects directly under a prefix"""
+        return [name for name in self._iter_keys(prefix) if '/' not in name]
+
+    @contextmanager
+    def local_copy(self, key: str) -> Iterator[Path]:
+        """Download the object to a temporary file for local processing.
+
+        Raises FileNotFoundError for a missing object, like ``LocalStorage``.
+        """
+        from botocore.exceptions import ClientError
+        fd, tmp = tempfile.mkstemp(suffix=PurePosixPath(key).suffix, dir=self.temp_dir)
+        os.close(fd)
+        try:
+            try:
+                self.client.download_file(self.bucket, self.object_key(key), tmp, Config=self.transfer)
+            except ClientError as e:
+                if self._is_missing(e):
+                    raise FileNotFoundError(f"No such object: {self.uri(key)}") from e
+                raise
+            yield Path(tmp)
+        finally:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+
+    def presigned_url(self, key: str) -> str:
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': self.object_key(key)},
+            ExpiresIn=self.presign_expiry
+        )
+
+    def response(self, key: str) -> Optional[Response]:
+        """Redirect to a presigned URL; S3 answers 404 itself if the object is missing"""
+        return RedirectResponse(self.presigned_url(key), status_code=307)
@@ -40,6 +40,37 @@ const AdminDashboard = () => {
     }
   }, [isLoggedIn]);
 
+  // Live processing progress pushed from the server instead of polling
+  useEffect(() => {
+    if (!isLoggedIn) return undefined;
+
+    const source = new EventSource(`${API}/stream/admin`);
+    source.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === 'image_processed') {
+        setImages(prev => prev.map(img => (
+          img.id === event.image_id
+            ? { ...img, processed: true, user_matches: event.user_matches }
+            : img
+        )));
+        setStats(prev => prev && {
+          ...prev,
+          processed_images: prev.processed_images + 1,
+          pending_images: Math.max(0, prev.pending_images - 1)
+        });
+      } else if (event.type === 'batch_complete') {
+        setProcessing(false);
+      } else if (event.type === 'resync') {
+        fetchDashboardData();
+      } else if (event.type === 'job_progress' && event.job && event.job.status !== 'running') {
+        // A background purge finished (or failed); reload what is left
+        fetchDashboardData();
+      }
+    };
+
+    return () => source.close();
+  }, [isLoggedIn]);
+
   const fetchDashboardData = async () => {
     try {
       const [statsRes, usersRes, imagesRes] = await Promise.all([
@@ -124,12 +155,12 @@ const AdminDashboard = () => {
     try {
       const response = await axios.post(`${API}/admin/process`);
 
-      if (response.data.success) {
+      if (response.data.queued) {
+        // Processing workers pick the images up on their own; progress arrives as image events
+        toast.success('Images queued for the processing workers');
+        setProcessing(false);
+      } else if (response.data.success) {
         toast.success('Face recognition processing started!');
-        setTimeout(() => {
-          fetchDashboardData();
-          setProcessing(false);
-        }, 3000);
       }
     } catch (error) {
       console.error('Process error:', error);
@@ -469,7 +500,7 @@ const AdminDashboard = () => {
                   >
                     <div className="relative aspect-square overflow-hidden bg-gray-100 border-b-3 border-black" style={{ borderBottomWidth: '3px' }}>
                       <img
-                        src={`${BACKEND_URL}/api/image/admin/${image.filename}`}
+                        src={`${BACKEND_URL}/api/image/admin/${image.id}`}
                         alt={image.filename}
                         className="w-full h-full object-cover"
                         onError={(e) => {
@@ -559,7 +590,7 @@ const AdminDashboard = () => {
               <br /><br />
               <div className="flex justify-center border-3 border-black p-2 bg-gray-100">
                 <img
-                  src={imageToDelete ? `${BACKEND_URL}/api/image/admin/${imageToDelete.filename}` : ''}
+                  src={imageToDelete ? `${BACKEND_URL}/api/image/admin/${imageToDelete.id}` : ''}
                   className="max-h-48 object-contain"
                   alt="To delete"
                 />
@@ -19,6 +19,24 @@ const GalleryPage = () => {
     fetchGallery();
   }, [galleryId]);
 
+  // New matches are pushed as they are processed
+  useEffect(() => {
+    const source = new EventSource(`${API}/stream/gallery/${galleryId}`);
+    source.onmessage = (e) => {
+      const event = JSON.parse(e.data);
+      if (event.type === 'photo_matched') {
+        setGallery(prev => {
+          if (!prev || prev.images.some(img => img.filename === event.filename)) return prev;
+          return { ...prev, images: [...prev.images, { filename: event.filename, url: event.url }] };
+        });
+      } else if (event.type === 'resync') {
+        fetchGallery();
+      }
+    };
+
+    return () => source.close();
+  }, [galleryId]);
+
   const fetchGallery = async () => {
     try {
       setLoading(true);
@@ -0,0 +1,51 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server creates its directories at import time; keep them out of the repo
+os.environ.setdefault('UPLOAD_DIR', tempfile.mkdtemp(prefix='cameo-tests-'))
+os.environ.setdefault('PRELOAD_MODELS', '0')
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    """An S3Storage on a moto-mocked bucket"""
+    moto = pytest.importorskip('moto')
+    boto3 = pytest.importorskip('boto3')
+    from storage import S3Storage
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    with moto.mock_aws():
+        boto3.client('s3', region_name='us-east-1').create_bucket(Bucket='cameo-test-bucket')
+        yield S3Storage('cameo-test-bucket', prefix='cameo', region='us-east-1',
+                        multipart_threshold=5 * 1024 * 1024)
+
+
+@pytest.fixture(params=['local', 's3'])
+def backend(request, tmp_path):
+    """Each storage backend in turn"""
+    if request.param == 'local':
+        from storage import LocalStorage
+        return LocalStorage(tmp_path)
+    return request.getfixturevalue('s3')
+
+
+@pytest.fixture
+def server():
+    """The server module wired to a fresh in-memory Mongo"""
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    import server as server_module
+
+    client = mongomock_motor.AsyncMongoMockClient()
+    original = server_module.client, server_module.db
+    server_module.client, server_module.db = client, client['tests']
+    server_module._encoding_indexes.clear()
+    yield server_module
+    server_module.client, server_module.db = original
+    server_module._encoding_indexes.clear()
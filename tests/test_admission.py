@@ -0,0 +1,85 @@
+import asyncio
+import io
+import uuid
+
+import pytest
+
+from admission import AdmissionController, AdmissionMiddleware, ClientBuckets, RouteClass, TokenBucket
+
+
+@pytest.fixture
+def limits(server, monkeypatch):
+    """Fresh buckets with per-client limits on, as with CLIENT_IP_HEADER set"""
+    monkeypatch.setattr(server.admission, 'enabled', True)
+    monkeypatch.setattr(server.admission, 'client_buckets',
+                        ClientBuckets(server.RATE_LIMIT_CLIENT_RPS, server.RATE_LIMIT_CLIENT_BURST))
+    monkeypatch.setattr(server.admission, 'global_bucket',
+                        TokenBucket(server.RATE_LIMIT_GLOBAL_RPS, server.RATE_LIMIT_GLOBAL_BURST))
+    return server.admission
+
+
+def test_token_bucket_refills_and_keeps_reserve():
+    bucket = TokenBucket(rate=10, burst=5)
+    assert all(bucket.take() == 0 for _ in range(5))
+    assert bucket.take() > 0
+    bucket.updated -= 0.3  # three tokens come back
+    assert bucket.take(cost=1, reserve=2) == 0
+    assert bucket.take(cost=1, reserve=2) > 0
+    assert bucket.take(cost=1) == 0
+
+
+def test_gallery_page_loads_every_photo(server, limits):
+    """GalleryPage fetches the listing, then every <img> at once from one client"""
+    httpx = pytest.importorskip('httpx')
+    user = {"id": str(uuid.uuid4()), "name": "guest", "gallery_id": uuid.uuid4().hex[:8],
+            "event_id": server.DEFAULT_EVENT_ID}
+    asyncio.run(server.db.users.insert_one(user))
+    for i in range(150):
+        key = server.get_gallery_key(server.DEFAULT_EVENT_ID, user['gallery_id'], f"photo-{i:03}.jpg")
+        server.storage.save(key, io.BytesIO(b'\xff\xd8\xff'))
+
+    async def load_page():
+        transport = httpx.ASGITransport(app=server.app, client=('203.0.113.7', 40000))
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as c:
+            listing = await c.get(f"/api/gallery/{user['gallery_id']}")
+            assert listing.status_code == 200
+            images = listing.json()['images']
+            responses = await asyncio.gather(*(c.get(image['url']) for image in images))
+            return images, [r.status_code for r in responses]
+
+    images, statuses = asyncio.run(load_page())
+    assert len(images) == 150
+    assert statuses == [200] * 150
+
+
+def test_registrations_are_limited_per_client():
+    async def ok(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    register = RouteClass('register', cost=10)
+    controller = AdmissionController([('POST', '/api/register', register)], ClientBuckets(1, 20),
+                                     TokenBucket(1000, 1000))
+    middleware = AdmissionMiddleware(ok, controller, client_ip_header='X-Real-IP')
+
+    async def post(ip: str) -> int:
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+        scope = {'type': 'http', 'method': 'POST', 'path': '/api/register',
+                 'headers': [(b'x-real-ip', ip.encode())], 'client': ('10.0.0.1', 1)}
+        await middleware(scope, None, send)
+        return sent[0]['status']
+
+    statuses = [asyncio.run(post('198.51.100.1')) for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    # A different guest behind the same proxy is unaffected
+    assert asyncio.run(post('198.51.100.2')) == 200
+
+
+def test_forged_forwarded_for_entries_are_ignored():
+    middleware = AdmissionMiddleware(None, None, client_ip_header='X-Forwarded-For')
+    scope = {'headers': [(b'x-forwarded-for', b'1.2.3.4, 5.6.7.8, 198.51.100.1')], 'client': ('10.0.0.1', 1)}
+    # Only the entry appended by the proxy identifies the client
+    assert middleware.client_key(scope) == '198.51.100.1'
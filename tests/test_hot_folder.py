@@ -0,0 +1,79 @@
+import asyncio
+import os
+import uuid
+
+import pytest
+
+
+@pytest.fixture
+def worker_mode(server, monkeypatch):
+    # Files are copied into storage and left for workers, nothing is processed inline
+    monkeypatch.setattr(server, 'PROCESSING_MODE', 'worker')
+    return server
+
+
+def ingest(server, folder, event_id=None):
+    ingestor = server.HotFolderIngestor(folder, event_id or server.DEFAULT_EVENT_ID, settle_seconds=0)
+
+    async def run():
+        ingestor.scan()
+        # The first pass records size and mtime, the second sees them settled
+        await ingestor._flush_settled()
+        await ingestor._flush_settled()
+    asyncio.run(run())
+    return ingestor
+
+
+def image_count(server):
+    return asyncio.run(server.db.images.count_documents({}))
+
+
+def test_purged_photos_are_not_registered_again(worker_mode, tmp_path):
+    server = worker_mode
+    (tmp_path / 'IMG_0001.JPG').write_bytes(b'photo')
+    ingest(server, tmp_path)
+    assert image_count(server) == 1
+
+    image = asyncio.run(server.db.images.find_one({}))
+    job_id = str(uuid.uuid4())
+    asyncio.run(server.db.jobs.insert_one({"id": job_id, "done": 0, "file_errors": 0}))
+    asyncio.run(server.run_purge_job(job_id, server.PurgeRequest(image_ids=[image['id']])))
+    assert (tmp_path / 'IMG_0001.JPG').exists()
+
+    # A restarted ingestor scans the folder again
+    ingest(server, tmp_path)
+    assert image_count(server) == 0
+
+
+def test_overwritten_file_is_registered_again(worker_mode, tmp_path):
+    server = worker_mode
+    photo = tmp_path / 'IMG_0001.JPG'
+    photo.write_bytes(b'photo')
+    ingest(server, tmp_path)
+    photo.write_bytes(b'another photo')
+    os.utime(photo, (1, 1))
+    ingest(server, tmp_path)
+    assert image_count(server) == 2
+
+
+def test_nothing_is_registered_into_a_missing_event(worker_mode, tmp_path):
+    server = worker_mode
+    (tmp_path / 'IMG_0001.JPG').write_bytes(b'photo')
+    ingest(server, tmp_path, event_id='purged-party')
+    assert image_count(server) == 0
+
+    asyncio.run(server.db.events.insert_one({"id": "purged-party"}))
+    ingest(server, tmp_path, event_id='purged-party')
+    assert image_count(server) == 1
+
+
+def test_same_name_in_two_subfolders_gets_two_gallery_names(worker_mode, tmp_path):
+    server = worker_mode
+    for camera in ('camera-a', 'camera-b'):
+        (tmp_path / camera).mkdir()
+        (tmp_path / camera / 'IMG_0001.JPG').write_bytes(camera.encode())
+    ingest(server, tmp_path)
+
+    images = asyncio.run(server.db.images.find({}).to_list(None))
+    assert len({image['filename'] for image in images}) == 2
+    assert all(image['filename'].endswith('IMG_0001.JPG') for image in images)
@@ -0,0 +1,47 @@
+import io
+
+from PIL import Image
+
+
+def jpeg(size, orientation=None, taken=None, offset=None) -> io.BytesIO:
+    img = Image.new('RGB', size, (200, 120, 40))
+    exif = Image.Exif()
+    if orientation:
+        exif[0x0112] = orientation
+    if taken:
+        sub = exif.get_ifd(0x8769)
+        sub[0x9003] = taken
+        if offset:
+            sub[0x9011] = offset
+    buf = io.BytesIO()
+    img.save(buf, 'JPEG', exif=exif.tobytes())
+    buf.seek(0)
+    return buf
+
+
+def test_full_resolution_by_default(server):
+    array, meta = server.load_image(jpeg((3000, 2000)))
+    assert array.shape == (2000, 3000, 3)
+    assert meta == {"scale": 1.0, "captured_at": None}
+
+
+def test_capped_decode_stays_within_max_side(server):
+    array, meta = server.load_image(jpeg((4000, 3000)), 1600)
+    height, width = array.shape[:2]
+    # Draft mode may land somewhat under the cap, never over it
+    assert 0.85 * 1600 <= width <= 1600
+    assert abs(meta['scale'] - width / 4000) < 1e-9
+
+
+def test_exif_orientation_is_applied(server):
+    array, meta = server.load_image(jpeg((400, 300), orientation=6), 200)
+    # Rotated 90 degrees: portrait, and the scale refers to the upright size
+    assert array.shape[0] > array.shape[1]
+    assert abs(meta['scale'] - array.shape[1] / 300) < 1e-9
+
+
+def test_capture_time_from_exif(server):
+    _, meta = server.load_image(jpeg((64, 48), taken='2024:06:01 18:30:05', offset='+02:00'))
+    assert meta['captured_at'] == '2024-06-01T18:30:05+02:00'
+    _, meta = server.load_image(jpeg((64, 48), taken='not a date'))
+    assert meta['captured_at'] is None
@@ -0,0 +1,148 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+
+
+def make_image(server, **fields):
+    return {
+        "id": str(uuid.uuid4()),
+        "event_id": server.DEFAULT_EVENT_ID,
+        "filename": "shot.jpg",
+        "upload_date": datetime.now(timezone.utc).isoformat(),
+        "processed": False,
+        "user_matches": [],
+        **fields,
+    }
+
+
+def insert_images(server, count, **fields):
+    images = [make_image(server, **fields) for _ in range(count)]
+    asyncio.run(server.db.images.insert_many(images))
+    return images
+
+
+def stored(server, image_id):
+    return asyncio.run(server.db.images.find_one({"id": image_id}))
+
+
+def test_two_claimers_never_get_the_same_image(server):
+    insert_images(server, 20)
+
+    async def claim_both():
+        return await asyncio.gather(server.claim_images('worker-a', 15), server.claim_images('worker-b', 15))
+
+    a, b = asyncio.run(claim_both())
+    ids_a, ids_b = {doc['id'] for doc in a}, {doc['id'] for doc in b}
+    assert not ids_a & ids_b
+    assert len(ids_a | ids_b) == 20
+    assert asyncio.run(server.claim_images('worker-c', 5)) == []
+
+
+def test_expired_lease_is_claimed_again(server):
+    expired, held = insert_images(server, 2)
+    asyncio.run(server.claim_images('worker-a', 2))
+    asyncio.run(server.db.images.update_one(
+        {"id": expired['id']}, {"$set": {"lease_until": datetime.now(timezone.utc) - timedelta(seconds=1)}}))
+
+    claimed = asyncio.run(server.claim_images('worker-b', 2))
+    assert [doc['id'] for doc in claimed] == [expired['id']]
+    assert stored(server, expired['id'])['lease_owner'] == 'worker-b'
+    assert stored(server, held['id'])['lease_owner'] == 'worker-a'
+
+
+def test_renew_leases_extends_only_our_unprocessed_images(server, monkeypatch):
+    monkeypatch.setattr(server, 'WORKER_LEASE_SECONDS', 0.06)
+    ours, done, theirs = insert_images(server, 3)
+    asyncio.run(server.claim_images('worker-a', 2))
+    asyncio.run(server.claim_images('worker-b', 1))
+    asyncio.run(server.db.images.update_one({"id": done['id']}, {"$set": {"processed": True}}))
+    before = {image['id']: stored(server, image['id'])['lease_until'] for image in (ours, done, theirs)}
+
+    async def renew_for_a_while():
+        renewer = asyncio.create_task(server.renew_leases('worker-a', [ours['id'], done['id'], theirs['id']]))
+        await asyncio.sleep(0.1)
+        renewer.cancel()
+    asyncio.run(renew_for_a_while())
+
+    assert stored(server, ours['id'])['lease_until'] > before[ours['id']]
+    assert stored(server, done['id'])['lease_until'] == before[done['id']]
+    assert stored(server, theirs['id'])['lease_until'] == before[theirs['id']]
+
+
+def test_missing_storage_object_is_marked_processed(server, backend, monkeypatch):
+    monkeypatch.setattr(server, 'storage', backend)
+    image, = insert_images(server, 1, storage_key='original/gone.jpg', original_path='original/gone.jpg')
+    claimed = asyncio.run(server.claim_images('worker-a', 1))
+
+    asyncio.run(server.process_claimed_images('worker-a', claimed))
+
+    doc = stored(server, image['id'])
+    assert doc['processed'] is True
+    assert doc['error'] == 'Original not found'
+    assert asyncio.run(server.claim_images('worker-a', 1)) == []
+
+
+def test_invisible_host_path_is_retried_then_given_up(server, monkeypatch, tmp_path):
+    monkeypatch.setattr(server, 'PROCESSING_MODE', 'worker')
+    image, = insert_images(server, 1, original_path=str(tmp_path / 'camera' / 'IMG_0001.JPG'),
+                           source='hot_folder')
+
+    for attempt in range(1, server.MISSING_ORIGINAL_ATTEMPTS + 1):
+        claimed = asyncio.run(server.claim_images('worker-a', 1))
+        assert [doc['id'] for doc in claimed] == [image['id']]
+        asyncio.run(server.process_claimed_images('worker-a', claimed))
+        doc = stored(server, image['id'])
+        if attempt < server.MISSING_ORIGINAL_ATTEMPTS:
+            # Released with a back-off, not finished
+            assert doc['processed'] is False
+            assert doc['missing_attempts'] == attempt
+            assert asyncio.run(server.claim_images('worker-b', 1)) == []
+            asyncio.run(server.db.images.update_one({"id": image['id']}, {"$set": {"lease_until": None}}))
+
+    assert doc['processed'] is True
+    assert doc['error'] == 'Original not found'
+
+
+def test_relay_delivers_only_new_events_in_order(server, monkeypatch):
+    monkeypatch.setattr(server, 'PIPELINE_EVENTS_POLL_SECONDS', 0.01)
+
+    async def relay():
+        await server.ensure_pipeline_events_collection()
+        await server.db.pipeline_events.insert_one({"topic": "admin", "event": {"n": 0}})
+        queue = server.broadcaster.subscribe('admin')
+        task = asyncio.create_task(server.relay_pipeline_events())
+        try:
+            await asyncio.sleep(0.05)
+            for n in range(1, 4):
+                await server.db.pipeline_events.insert_one({"topic": "admin", "event": {"n": n}})
+            await asyncio.sleep(0.1)
+        finally:
+            task.cancel()
+            server.broadcaster.unsubscribe('admin', queue)
+        return [queue.get_nowait() for _ in range(queue.qsize())]
+
+    messages = asyncio.run(relay())
+    assert messages == [f'data: {{"n": {n}}}\n\n' for n in (1, 2, 3)]
+
+
+def test_metrics_report_the_whole_backlog(server):
+    insert_images(server, 12)
+    asyncio.run(server.claim_images('worker-a', 4))
+
+    body = TestClient(server.app).get('/metrics').text
+    assert 'cameo_pending_images 12.0' in body
+
+
+def test_stored_events_are_kept_alive_until_written(server, monkeypatch):
+    monkeypatch.setattr(server.broadcaster, 'shared', True)
+
+    async def publish():
+        server.broadcaster.publish('admin', {"type": "resync"})
+        assert len(server._background_tasks) == 1
+        await asyncio.gather(*server._background_tasks)
+        return await server.db.pipeline_events.count_documents({})
+
+    assert asyncio.run(publish()) == 1
+    assert not server._background_tasks
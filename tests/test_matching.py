@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+
+def test_each_face_goes_to_at_most_one_user(server):
+    # Both users are close to face 0; user 1 is closer, user 0 falls back to face 1
+    distances = np.array([[0.30, 0.50],
+                          [0.25, 0.90]])
+    pairs = sorted(server.assign_faces(distances, 0.6, 'greedy'))
+    assert [(user, face) for user, face, _ in pairs] == [(0, 1), (1, 0)]
+
+
+def test_pairs_over_tolerance_are_dropped(server):
+    distances = np.array([[0.7, 0.8]])
+    assert server.assign_faces(distances, 0.6, 'greedy') == []
+
+
+def test_hungarian_minimises_total_distance(server):
+    pytest.importorskip('scipy')
+    # Greedy takes (1, 0) at 0.30 first and leaves user 0 with 0.59;
+    # the optimum pairs (0, 0) and (1, 1) for a lower total
+    distances = np.array([[0.31, 0.59],
+                          [0.30, 0.32]])
+    pairs = sorted(server.assign_faces(distances, 0.6, 'hungarian'))
+    assert [(user, face) for user, face, _ in pairs] == [(0, 0), (1, 1)]
+
+
+def test_index_matches_the_nearest_user(server):
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(size=(20, 128)) * 0.1
+    users = [{"id": f"u{i}", "name": f"u{i}", "gallery_id": f"g{i}",
+              "face_encoding": server.pack_encoding(encodings[i])} for i in range(20)]
+    index = server.EventEncodingIndex(users)
+    face = encodings[7] + rng.normal(size=128) * 0.001
+    assignments = index.assign([face.tolist()])
+    assert [(index.user_ids[pos], face_index) for pos, face_index, _ in assignments] == [("u7", 0)]
@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+
+from fastapi.testclient import TestClient
+
+
+def insert_image(server, faces=2):
+    image = {"id": str(uuid.uuid4()), "event_id": server.DEFAULT_EVENT_ID, "processed": True,
+             "faces": [{"box": [0, 10, 10, 0], "encoding": server.pack_encoding([0.0] * 128)}] * faces}
+    asyncio.run(server.db.images.insert_one(image))
+    return image
+
+
+def fake_chips(server, monkeypatch):
+    jitters = []
+
+    def encode(chip_keys, num_jitters=1):
+        jitters.append(num_jitters)
+        return [[float(num_jitters)] * 128 for _ in chip_keys]
+    monkeypatch.setattr(server, 'encode_face_chips', encode)
+    return jitters
+
+
+def test_reencode_runs_in_the_api_process_inline(server, monkeypatch):
+    jitters = fake_chips(server, monkeypatch)
+    image = insert_image(server)
+
+    response = TestClient(server.app).post('/api/admin/faces/reencode?num_jitters=3')
+
+    assert response.status_code == 200
+    job = asyncio.run(server.db.jobs.find_one({"id": response.json()['job_id']}))
+    assert job['status'] == 'completed' and job['done'] == 1
+    assert jitters == [3]
+    doc = asyncio.run(server.db.images.find_one({"id": image['id']}))
+    assert doc['encoding_jitters'] == 3
+    assert server.unpack_encoding(doc['faces'][0]['encoding'])[0] == 3
+
+
+def test_reencode_is_left_to_workers_in_worker_mode(server, monkeypatch):
+    jitters = fake_chips(server, monkeypatch)
+    monkeypatch.setattr(server, 'PROCESSING_MODE', 'worker')
+    insert_image(server)
+
+    job_id = TestClient(server.app).post('/api/admin/faces/reencode?num_jitters=2').json()['job_id']
+    # Nothing ran in the API process
+    assert jitters == []
+    assert asyncio.run(server.db.jobs.find_one({"id": job_id}))['status'] == 'queued'
+
+    job = asyncio.run(server.claim_reencode_job('worker-a'))
+    assert job['id'] == job_id and job['owner'] == 'worker-a'
+    assert asyncio.run(server.claim_reencode_job('worker-b')) is None
+    asyncio.run(server.run_reencode_job(job))
+    assert jitters == [2]
+    assert asyncio.run(server.db.jobs.find_one({"id": job_id}))['status'] == 'completed'
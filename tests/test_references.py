@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import uuid
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+
+def make_user(server, selfies: int):
+    rng = np.random.default_rng()
+    refs = [rng.normal(size=128).astype(np.float32) for _ in range(selfies)]
+    return {
+        "id": str(uuid.uuid4()),
+        "name": "guest",
+        "gallery_id": "g1",
+        "event_id": server.DEFAULT_EVENT_ID,
+        **server.face_template_fields(refs),
+    }
+
+
+def references(server, user_id):
+    doc = asyncio.run(server.db.users.find_one({"id": user_id}))
+    return [server.unpack_encoding(r) for r in doc['reference_encodings']], doc['selfie_count']
+
+
+def test_auto_enroll_stops_at_the_live_limit(server):
+    user = make_user(server, 2)
+    asyncio.run(server.db.users.insert_one(user))
+    counts = [asyncio.run(server.add_reference_encoding(user['id'], np.full(128, i, np.float32), auto=True))
+              for i in range(10)]
+    assert counts[:3] == [3, 4, 5]
+    assert counts[3:] == [None] * 7
+    refs, selfies = references(server, user['id'])
+    assert len(refs) == server.MAX_REFERENCE_ENCODINGS
+    assert selfies == 2
+
+
+def test_new_selfie_displaces_auto_enrolled_first(server):
+    user = make_user(server, 2)
+    asyncio.run(server.db.users.insert_one(user))
+    for i in range(3):
+        asyncio.run(server.add_reference_encoding(user['id'], np.full(128, 10 + i, np.float32), auto=True))
+    selfie = np.full(128, 99, np.float32)
+    assert asyncio.run(server.add_reference_encoding(user['id'], selfie)) == server.MAX_REFERENCE_ENCODINGS
+
+    refs, selfies = references(server, user['id'])
+    assert selfies == 3
+    np.testing.assert_array_equal(refs[2], selfie)
+    # The oldest auto-enrolled reference went, the newer ones stay
+    assert [r[0] for r in refs[3:]] == [11, 12]
+
+
+def test_concurrent_auto_enrolls_do_not_lose_updates(server):
+    user = make_user(server, 1)
+    asyncio.run(server.db.users.insert_one(user))
+
+    async def enroll_many():
+        return await asyncio.gather(*(
+            server.add_reference_encoding(user['id'], np.full(128, i, np.float32), auto=True)
+            for i in range(8)
+        ))
+
+    results = asyncio.run(enroll_many())
+    refs, selfies = references(server, user['id'])
+    assert len(refs) == server.MAX_REFERENCE_ENCODINGS
+    assert sum(r is not None for r in results) == server.MAX_REFERENCE_ENCODINGS - 1
+    assert selfies == 1
+
+
+def test_registration_encodes_its_selfies_on_one_thread(server, monkeypatch):
+    threads = []
+
+    def fake_encode(data):
+        threads.append(threading.get_ident())
+        return [float(len(data))] * 128
+
+    monkeypatch.setattr(server, 'encode_face_from_base64', fake_encode)
+    client = TestClient(server.app)
+    response = client.post('/api/register', json={
+        "name": "guest", "email": "guest@example.com", "phone": "0",
+        "face_image_data": "a", "additional_face_images": ["bb", "ccc", "dddd", "eeeee"]})
+
+    assert response.status_code == 200
+    assert len(threads) == server.MAX_REFERENCE_ENCODINGS
+    assert len(set(threads)) == 1
+
+
+def test_registration_without_a_face_stops_after_the_first_selfie(server, monkeypatch):
+    calls = []
+    monkeypatch.setattr(server, 'encode_face_from_base64', lambda data: calls.append(data))
+    response = TestClient(server.app).post('/api/register', json={
+        "name": "guest", "email": "guest@example.com", "phone": "0",
+        "face_image_data": "a", "additional_face_images": ["bb", "ccc"]})
+
+    assert response.status_code == 400
+    assert calls == ["a"]
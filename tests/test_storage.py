@@ -0,0 +1,83 @@
+import asyncio
+import io
+import uuid
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from storage import LocalStorage
+
+
+def test_roundtrip_list_copy_and_delete(backend):
+    backend.save('original/a.jpg', io.BytesIO(b'aaa'))
+    backend.save('original/b.jpg', io.BytesIO(b'bbb'))
+    backend.copy('original/a.jpg', 'users/g1/a.jpg')
+
+    assert sorted(backend.list('original')) == ['a.jpg', 'b.jpg']
+    assert backend.list('users/g1') == ['a.jpg']
+    with backend.local_copy('users/g1/a.jpg') as path:
+        assert path.read_bytes() == b'aaa'
+
+    backend.delete_many(['original/a.jpg'])
+    assert backend.list('original') == ['b.jpg']
+    backend.delete_prefix('users/g1')
+    assert backend.list('users/g1') == []
+    assert not backend.exists('users/g1/a.jpg')
+
+
+def test_missing_object_raises_file_not_found(backend):
+    with pytest.raises(FileNotFoundError):
+        with backend.local_copy('original/missing.jpg'):
+            pass
+
+
+def test_keys_cannot_escape_the_root(backend):
+    with pytest.raises(ValueError):
+        backend.save('../outside.jpg', io.BytesIO(b'x'))
+
+
+def test_s3_multipart_upload(s3):
+    payload = bytes(12 * 1024 * 1024)
+    s3.save('original/big.jpg', io.BytesIO(payload))
+    with s3.local_copy('original/big.jpg') as path:
+        assert path.stat().st_size == len(payload)
+
+
+def test_s3_response_redirects_to_presigned_url(s3):
+    s3.save('users/g1/a.jpg', io.BytesIO(b'x'))
+    response = s3.response('users/g1/a.jpg')
+    assert response.status_code == 307
+    assert s3.bucket in response.headers['location']
+
+
+def test_face_crops_are_shared_through_storage(server, s3, monkeypatch):
+    monkeypatch.setattr(server, 'storage', s3)
+    image_id = str(uuid.uuid4())
+    image = np.zeros((100, 100, 3), np.uint8)
+    server.save_face_crops(image, [[10, 60, 60, 10]], None, server.get_face_crop_prefix(image_id))
+    asyncio.run(server.db.images.insert_one({"id": image_id, "filename": "a.jpg"}))
+
+    assert s3.list(server.get_face_crop_prefix(image_id)) == ['0.jpg']
+    client = TestClient(server.app)
+    response = client.get(f"/api/admin/faces/{image_id}/0", follow_redirects=False)
+    assert response.status_code == 307
+    assert client.get(f"/api/admin/faces/{uuid.uuid4()}/0").status_code == 404
+
+
+def test_admin_originals_are_served_by_image_id(server):
+    # Same filename in two events: only the id tells them apart
+    images = []
+    for event_id in ('party', 'wedding'):
+        image = {"id": str(uuid.uuid4()), "event_id": event_id, "filename": "IMG_0001.JPG",
+                 "storage_key": server.get_original_key(event_id, 'IMG_0001.JPG')}
+        server.storage.save(image['storage_key'], io.BytesIO(event_id.encode()))
+        images.append(image)
+    asyncio.run(server.db.images.insert_many(images))
+
+    client = TestClient(server.app)
+    for image in images:
+        response = client.get(f"/api/image/admin/{image['id']}")
+        assert response.status_code == 200
+        assert response.content == image['event_id'].encode()
+    assert client.get(f"/api/image/admin/{uuid.uuid4()}").status_code == 404